@@ -1,10 +1,34 @@
 from agno.models.perplexity import Perplexity
 from agno.models.groq import Groq
 from agno.models.openai import OpenAIChat
+from backend.agents import model_registry
+from backend.utils.json_extract import extract_json_from_stream
+
+model_registry.register_provider("perplexity", Perplexity)
+model_registry.register_provider("groq", Groq)
+model_registry.register_provider("openai", OpenAIChat)
+
 def create_model_instance(provider, model_name, api_key):
-    if provider == "Perplexity":
-        return Perplexity(id=model_name, api_key=api_key)
-    elif provider == "Groq":
-        return Groq(id=model_name, api_key=api_key)
-    elif provider == "OpenAI":
-        return OpenAIChat(id=model_name, api_key=api_key)
+    """Build a model whose HTTP connections are pooled per (provider, api_key)."""
+    return model_registry.create_model_instance(provider, model_name, api_key)
+
+def close_model_clients():
+    model_registry.close_http_clients()
+
+def model_rate_limit_stats():
+    return model_registry.rate_limit_stats()
+
+def run_for_json(agent, prompt):
+    """Stream an agent run and stop as soon as the first JSON object closes.
+    
+    Returns `(data, response_text)`; `data` is None if no object could be
+    parsed, in which case `response_text` holds the whole response.
+    """
+    chunks = agent.run(prompt, stream=True)
+    try:
+        return extract_json_from_stream(
+            chunk.content if hasattr(chunk, "content") else str(chunk) for chunk in chunks
+        )
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
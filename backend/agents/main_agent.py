@@ -1,15 +1,24 @@
 from agno.agent import Agent
 from backend.agents.base import create_model_instance
 from backend.storage.loader import load_session_storage
+from backend.utils.cache import stable_hash
+from backend.utils.token_budget import RollingHistory, estimate_tokens, truncate_to_tokens
 import json
 
 class AdaptiveChatAgent:
-    def __init__(self, provider, model_name, api_key):
+    # Shorter messages ("yes", "tell me more") depend on the conversation, not just the text
+    CACHE_MIN_WORDS = 4
+    
+    def __init__(self, provider, model_name, api_key, model=None, user_id=None, history_turns=6, max_prompt_tokens=6000,
+                 response_cache=None):
         self.agent = Agent(
             name="Adaptive Chat Agent",
             role="Provide personalized conversational responses based on user personality.",
-            model=create_model_instance(provider, model_name, api_key),
-            add_history_to_messages=True,
+            model=model or create_model_instance(provider, model_name, api_key),
+            user_id=user_id,
+            # History is replayed from self.history (see _history_messages), not
+            # agno's stored runs: those hold whole prompts, context included
+            add_history_to_messages=False,
             storage=load_session_storage(),
             instructions="""
                 You are an adaptive conversational agent that personalizes responses based on user personality.
@@ -27,14 +36,21 @@ class AdaptiveChatAgent:
             markdown=True,
             stream=False,
         )
+        self.user_id = user_id
         self.personality_profile = {}
+        # The last `history_turns` turns are resent verbatim; older ones survive only as a digest
+        self.history = RollingHistory(max_turns=history_turns)
+        self.max_prompt_tokens = max_prompt_tokens
+        # Optional utils.similarity_cache.SemanticCache of replies (opt-in, see CHAT_CACHE_ENABLED);
+        # it may be shared by a manager pool, so entries are bucketed per user
+        self.response_cache = response_cache
     
     def update_personality_context(self, personality_data):
         """Update the personality context for response adaptation."""
         self.personality_profile = personality_data
     
-    def generate_response(self, user_input, context="", personality_adaptations=None):
-        """Generate personality-adapted response."""
+    def _build_prompt(self, user_input, context="", personality_adaptations=None):
+        """Build the personality-aware chat prompt."""
         if personality_adaptations is None:
             personality_adaptations = {}
         
@@ -60,23 +76,102 @@ class AdaptiveChatAgent:
             - {"Include relevant examples and analogies" if examples else "Focus on direct answers without examples"}
             """
         
-        full_prompt = f"""
+        digest = self.history.digest
+        history_context = f"Earlier conversation (summary):\n{digest}" if digest else ""
+        
+        def render(context_text):
+            return f"""
         {adaptation_context}
         
-        Context: {context}
+        {history_context}
+        
+        Context: {context_text}
         
         User: {user_input}
         
         Provide a helpful response adapted to the user's communication preferences.
         """
         
+        # Spend whatever the budget leaves after history and the fixed prompt on context
+        available = self.max_prompt_tokens - self.history.recent_tokens() - estimate_tokens(render(""))
+        return render(truncate_to_tokens(context, max(available, 0)))
+    
+    def _history_messages(self):
+        """Recent turns as chat messages: the short user input and reply, never the full prompt."""
+        messages = []
+        for user_input, response_text in self.history.turns:
+            messages.append({"role": "user", "content": user_input})
+            messages.append({"role": "assistant", "content": response_text})
+        return messages
+    
+    def get_cache_stats(self):
+        return self.response_cache.stats() if self.response_cache is not None else None
+    
+    def _cache_bucket(self, user_input, context, personality_adaptations):
+        """Cache bucket for a turn, or None when the turn shouldn't use the response cache."""
+        if self.response_cache is None or len(user_input.split()) < self.CACHE_MIN_WORDS:
+            return None
+        adaptations = personality_adaptations or {}
+        # Replies depend on each user's own history, so users never share entries
+        return stable_hash([
+            self.user_id,
+            adaptations.get("response_tone"),
+            adaptations.get("response_length"),
+            adaptations.get("formality_level"),
+            adaptations.get("include_examples"),
+            stable_hash(context or "")
+        ])
+    
+    def generate_response(self, user_input, context="", personality_adaptations=None):
+        """Generate personality-adapted response."""
+        bucket = self._cache_bucket(user_input, context, personality_adaptations)
+        if bucket is not None:
+            cached = self.response_cache.get(bucket, user_input)
+            if cached is not None:
+                self.history.add(user_input, cached)
+                return cached
+        
+        full_prompt = self._build_prompt(user_input, context, personality_adaptations)
+        
         try:
-            response = self.agent.run(full_prompt)
-            return response.content if hasattr(response, "content") else str(response)
+            # Explicit: agno keeps `stream=True` on the agent after a streamed run
+            response = self.agent.run(full_prompt, stream=False, messages=self._history_messages())
+            response_text = response.content if hasattr(response, "content") else str(response)
+            self.history.add(user_input, response_text)
+            if bucket is not None and response_text:
+                self.response_cache.set(bucket, user_input, response_text)
+            return response_text
         except Exception as e:
             print(f"Error in chat response generation: {e}")
             return "I apologize, but I encountered an error processing your request. Please try again."
+    
+    def stream_response(self, user_input, context="", personality_adaptations=None):
+        """Generate a personality-adapted response, yielding text deltas as they arrive."""
+        bucket = self._cache_bucket(user_input, context, personality_adaptations)
+        if bucket is not None:
+            cached = self.response_cache.get(bucket, user_input)
+            if cached is not None:
+                self.history.add(user_input, cached)
+                yield cached
+                return
+        
+        full_prompt = self._build_prompt(user_input, context, personality_adaptations)
+        
+        try:
+            deltas = []
+            for chunk in self.agent.run(full_prompt, stream=True, messages=self._history_messages()):
+                delta = chunk.content if hasattr(chunk, "content") else str(chunk)
+                if delta:
+                    deltas.append(delta)
+                    yield delta
+            response_text = "".join(deltas)
+            self.history.add(user_input, response_text)
+            if bucket is not None and response_text:
+                self.response_cache.set(bucket, user_input, response_text)
+        except Exception as e:
+            print(f"Error in chat response streaming: {e}")
+            yield "I apologize, but I encountered an error processing your request. Please try again."
 
-def create_main_agent(provider, model_name, api_key, _personality_agent, _task_agent):
+def create_main_agent(provider, model_name, api_key, _personality_agent, _task_agent, **options):
     """Create the enhanced adaptive chat agent."""
-    return AdaptiveChatAgent(provider, model_name, api_key)
+    return AdaptiveChatAgent(provider, model_name, api_key, **options)
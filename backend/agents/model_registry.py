@@ -1,12 +1,95 @@
 # agents/model_registry.py
+import json
+import os
+import threading
+import httpx
+from backend.agents.rate_limit import ProviderLimiter, RateLimitedModel
 
 model_providers = {}
 
+# Keep-alive pool limits for the HTTP client shared per (provider, api_key)
+MODEL_POOL_MAX_CONNECTIONS = int(os.getenv("MODEL_POOL_MAX_CONNECTIONS", "20"))
+MODEL_POOL_MAX_KEEPALIVE = int(os.getenv("MODEL_POOL_MAX_KEEPALIVE", "10"))
+MODEL_POOL_KEEPALIVE_EXPIRY = float(os.getenv("MODEL_POOL_KEEPALIVE_EXPIRY", "60"))
+MODEL_REQUEST_TIMEOUT = float(os.getenv("MODEL_REQUEST_TIMEOUT", "60"))
+
+# Per-provider budgets, e.g. {"perplexity": {"rpm": 50, "tpm": 40000}}; unlisted providers are unlimited
+MODEL_RATE_LIMITS = {name.lower(): limits for name, limits in json.loads(os.getenv("MODEL_RATE_LIMITS", "{}")).items()}
+# Queueing and backoff sleep on an executor thread, so keep both short: a
+# throttled provider should fail fast rather than park every worker
+MODEL_RATE_LIMIT_MAX_WAIT = float(os.getenv("MODEL_RATE_LIMIT_MAX_WAIT", "5"))
+MODEL_RETRY_ATTEMPTS = int(os.getenv("MODEL_RETRY_ATTEMPTS", "4"))
+MODEL_RETRY_BASE_DELAY = float(os.getenv("MODEL_RETRY_BASE_DELAY", "0.5"))
+MODEL_RETRY_MAX_DELAY = float(os.getenv("MODEL_RETRY_MAX_DELAY", "5"))
+
+http_clients = {}
+http_clients_lock = threading.Lock()
+limiters = {}
+
 def register_provider(name, cls):
     model_providers[name.lower()] = cls
 
-def create_model_instance(provider, model_name, api_key):
+def get_http_client(provider, api_key):
+    """Return the keep-alive HTTP client shared by every model of (provider, api_key)."""
+    key = (provider.lower(), api_key)
+    with http_clients_lock:
+        client = http_clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MODEL_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=MODEL_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=MODEL_POOL_KEEPALIVE_EXPIRY
+                ),
+                timeout=MODEL_REQUEST_TIMEOUT
+            )
+            http_clients[key] = client
+        return client
+
+def close_http_clients():
+    """Close every shared HTTP client (used on shutdown)."""
+    with http_clients_lock:
+        clients = list(http_clients.values())
+        http_clients.clear()
+    for client in clients:
+        client.close()
+
+def get_limiter(provider, api_key):
+    """Return the limiter shared by every model of (provider, api_key), or None if unlimited."""
+    limits = MODEL_RATE_LIMITS.get(provider.lower())
+    if not limits:
+        return None
+    key = (provider.lower(), api_key)
+    with http_clients_lock:
+        limiter = limiters.get(key)
+        if limiter is None:
+            limiter = limiters[key] = ProviderLimiter(
+                rpm=limits.get("rpm"), tpm=limits.get("tpm"), max_wait=MODEL_RATE_LIMIT_MAX_WAIT
+            )
+        return limiter
+
+def rate_limit_stats():
+    with http_clients_lock:
+        current = dict(limiters)
+    return {provider: limiter.stats() for (provider, _), limiter in current.items()}
+
+def create_model_instance(provider, model_name, api_key, retry=True, **params):
+    """Build a provider model, wrapped in RateLimitedModel when the provider has a budget.
+    
+    Rate-limited models retry in the wrapper, where every attempt is counted
+    against the budget, so the SDK's own retries are turned off. With
+    `retry=False` (router routes, which fail over instead) no layer retries.
+    """
     cls = model_providers.get(provider.lower())
     if not cls:
         raise ValueError(f"Unknown provider: {provider}")
-    return cls(id=model_name, api_key=api_key)
+    limiter = get_limiter(provider, api_key)
+    if limiter is not None or not retry:
+        params.setdefault("max_retries", 0)
+    model = cls(id=model_name, api_key=api_key, http_client=get_http_client(provider, api_key), **params)
+    if limiter is None:
+        return model
+    return RateLimitedModel(
+        model, limiter, max_retries=MODEL_RETRY_ATTEMPTS if retry else 0,
+        base_delay=MODEL_RETRY_BASE_DELAY, max_delay=MODEL_RETRY_MAX_DELAY
+    )
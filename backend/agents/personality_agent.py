@@ -1,40 +1,140 @@
 from agno.agent import Agent
-from backend.agents.base import create_model_instance
-from backend.storage.loader import load_personality_storage
+from backend.agents.base import create_model_instance, run_for_json
+from backend.storage.loader import load_personality_storage, load_profile_store
+from backend.utils.token_budget import estimate_tokens, truncate_to_tokens
+import numpy as np
 import json
 import os
+import re
+import time
+
+# Numeric traits blended locally from per-turn evidence
+TRAIT_NAMES = (
+    "openness",
+    "conscientiousness",
+    "extraversion",
+    "agreeableness",
+    "neuroticism",
+    "communication_directness",
+    "technical_aptitude",
+)
+
+# Categorical profile sections the LLM may report changes for
+CATEGORICAL_SECTIONS = ("preferences", "communication_style", "ui_preferences")
+
+# Evidence blending parameters:
+# - traits with no history start at TRAIT_PRIOR with TRAIT_PRIOR_WEIGHT of evidence,
+#   so a single turn can't swing them to an extreme
+# - accumulated evidence weight halves every TRAIT_HALF_LIFE_SECONDS of inactivity,
+#   so a stale profile adapts faster to new evidence
+# - weight is capped at MAX_TRAIT_WEIGHT so the blend behaves like an EMA and
+#   never freezes, and categorical changes need MIN_CATEGORICAL_CONFIDENCE
+TRAIT_PRIOR = 0.5
+TRAIT_PRIOR_WEIGHT = 1.0
+TRAIT_HALF_LIFE_SECONDS = 7 * 24 * 3600
+MAX_TRAIT_WEIGHT = 8.0
+MIN_CATEGORICAL_CONFIDENCE = 0.5
+
+def blend_traits(values, weights, observed, confidence, elapsed_seconds):
+    """Confidence-weighted EMA of trait vectors with time decay.
+    
+    `values`/`weights` are the current trait estimates and their evidence
+    mass, `observed`/`confidence` the per-turn evidence (confidence 0 where
+    the turn said nothing about a trait). Returns the new (values, weights).
+    """
+    decay = 0.5 ** (max(elapsed_seconds, 0.0) / TRAIT_HALF_LIFE_SECONDS)
+    prior_weights = weights * decay
+    total = prior_weights + confidence
+    blended = np.where(total > 0, (prior_weights * values + confidence * observed) / np.maximum(total, 1e-9), values)
+    return np.clip(blended, 0.0, 1.0), np.minimum(total, MAX_TRAIT_WEIGHT)
 
 class PersonalityProfile:
     def __init__(self):
         self.traits = {}
+        self.trait_weights = {}
         self.preferences = {}
         self.communication_style = {}
         self.ui_preferences = {}
         self.interaction_history = []
+        self.last_updated = None
     
     def to_dict(self):
         return {
             "traits": self.traits,
+            "trait_weights": self.trait_weights,
             "preferences": self.preferences,
             "communication_style": self.communication_style,
             "ui_preferences": self.ui_preferences,
-            "interaction_history": self.interaction_history[-10:]  # Keep last 10 interactions
+            "interaction_history": self.interaction_history[-10:],  # Keep last 10 interactions
+            "last_updated": self.last_updated
         }
     
     def from_dict(self, data):
         self.traits = data.get("traits", {})
+        self.trait_weights = data.get("trait_weights", {})
         self.preferences = data.get("preferences", {})
         self.communication_style = data.get("communication_style", {})
         self.ui_preferences = data.get("ui_preferences", {})
         self.interaction_history = data.get("interaction_history", [])
+        self.last_updated = data.get("last_updated")
+    
+    def to_prompt_dict(self):
+        """Compact view of the profile sent to the LLM (no history or weights)."""
+        return {
+            "traits": {name: round(value, 2) for name, value in self.traits.items()},
+            "preferences": self.preferences,
+            "communication_style": self.communication_style,
+            "ui_preferences": self.ui_preferences
+        }
+    
+    def apply_evidence(self, evidence, now=None):
+        """Blend one analysis worth of evidence into the profile."""
+        now = time.time() if now is None else now
+        elapsed = now - self.last_updated if self.last_updated else 0.0
+        
+        trait_evidence = evidence.get("trait_evidence", {}) or {}
+        values = np.array([float(self.traits.get(name, TRAIT_PRIOR)) for name in TRAIT_NAMES])
+        weights = np.array([float(self.trait_weights.get(name, TRAIT_PRIOR_WEIGHT)) for name in TRAIT_NAMES])
+        observed = values.copy()
+        confidence = np.zeros(len(TRAIT_NAMES))
+        for i, name in enumerate(TRAIT_NAMES):
+            item = trait_evidence.get(name)
+            if not isinstance(item, dict):
+                continue
+            try:
+                observed[i] = float(item.get("value"))
+                confidence[i] = float(item.get("confidence", 0.0))
+            except (TypeError, ValueError):
+                continue
+        confidence = np.clip(confidence, 0.0, 1.0)
+        observed = np.clip(observed, 0.0, 1.0)
+        
+        values, weights = blend_traits(values, weights, observed, confidence, elapsed)
+        self.traits = {name: round(float(v), 4) for name, v in zip(TRAIT_NAMES, values)}
+        self.trait_weights = {name: round(float(w), 4) for name, w in zip(TRAIT_NAMES, weights)}
+        
+        # Categorical fields only change on reasonably confident evidence
+        section_confidence = evidence.get("confidence", {}) or {}
+        for section in CATEGORICAL_SECTIONS:
+            changes = evidence.get(section) or {}
+            try:
+                section_score = float(section_confidence.get(section, 0.0))
+            except (TypeError, ValueError):
+                section_score = 0.0
+            if changes and isinstance(changes, dict) and section_score >= MIN_CATEGORICAL_CONFIDENCE:
+                setattr(self, section, {**getattr(self, section), **changes})
+        
+        self.last_updated = now
 
 class DynamicPersonalityAgent:
-    def __init__(self, provider, model_name, api_key):
+    def __init__(self, provider, model_name, api_key, model=None, user_id=None, profile_store=None, history_turns=0, max_prompt_tokens=2500):
         self.agent = Agent(
             name="Dynamic Personality Agent",
             role="Build and maintain dynamic user personality profiles for adaptive interactions.",
-            model=create_model_instance(provider, model_name, api_key),
-            add_history_to_messages=True,
+            model=model or create_model_instance(provider, model_name, api_key),
+            user_id=user_id,
+            add_history_to_messages=history_turns > 0,
+            num_history_responses=history_turns,
             storage=load_personality_storage(),
             instructions="""
                 You are a dynamic personality analysis agent. Your role is to:
@@ -43,113 +143,126 @@ class DynamicPersonalityAgent:
                 3. Generate JSON output for other agents to consume
                 4. Suggest UI adaptations based on personality insights
                 
-                For each analysis, provide a JSON response with these sections:
-                - traits: Core personality traits (Big Five, communication style, etc.)
-                - preferences: User preferences for interaction, content, format
-                - communication_style: How the user prefers to communicate
-                - ui_preferences: Suggested UI adaptations (colors, layout, complexity)
-                - confidence_scores: How confident you are in each assessment (0-1)
+                For each analysis, report only the evidence found in the new interaction:
+                - trait_evidence: Traits the interaction says something about, each with the
+                  value it suggests (0-1) and your confidence in that evidence (0-1)
+                - preferences / communication_style / ui_preferences: Only fields that the
+                  interaction suggests should change
+                - confidence: How confident you are in each changed section (0-1)
                 
-                Always maintain and update the existing profile rather than starting fresh.
+                Never restate the whole profile; it is blended locally from your evidence.
                 Focus on actionable insights that can improve user experience.
             """,
             markdown=False,
             stream=False,
         )
         self.profile = PersonalityProfile()
-        self.profile_file = "user_personality_profile.json"
+        self.max_prompt_tokens = max_prompt_tokens
+        self.ui_preferences_listeners = []
+        self.user_id = user_id
+        self.profile_key = user_id or "default"
+        self.profile_store = profile_store or load_profile_store()
+        # Pre-store JSON profile, imported once if the store has nothing for this user
+        if user_id:
+            safe_user_id = re.sub(r"[^A-Za-z0-9_.-]", "_", user_id)
+            self.profile_file = f"user_personality_profile_{safe_user_id}.json"
+        else:
+            self.profile_file = "user_personality_profile.json"
         self.load_profile()
     
     def load_profile(self):
-        """Load existing personality profile from file."""
-        if os.path.exists(self.profile_file):
-            try:
+        """Load existing personality profile from the profile store."""
+        try:
+            data = self.profile_store.load(self.profile_key)
+            if data is None and os.path.exists(self.profile_file):
                 with open(self.profile_file, 'r') as f:
                     data = json.load(f)
-                    self.profile.from_dict(data)
-            except Exception as e:
-                print(f"Warning: Could not load personality profile: {e}")
+                self.profile_store.save(self.profile_key, data)
+            if data is not None:
+                self.profile.from_dict(data)
+        except Exception as e:
+            print(f"Warning: Could not load personality profile: {e}")
     
     def save_profile(self):
-        """Save personality profile to file."""
+        """Queue the personality profile for the store's next batched commit."""
         try:
-            with open(self.profile_file, 'w') as f:
-                json.dump(self.profile.to_dict(), f, indent=2)
+            self.profile_store.save(self.profile_key, self.profile.to_dict())
         except Exception as e:
             print(f"Warning: Could not save personality profile: {e}")
     
+    def on_ui_preferences_change(self, callback):
+        """Register a callback invoked with the new ui_preferences whenever they change."""
+        self.ui_preferences_listeners.append(callback)
+    
+    def _notify_ui_preferences_change(self, previous_ui_preferences):
+        if self.profile.ui_preferences == previous_ui_preferences:
+            return
+        for callback in self.ui_preferences_listeners:
+            try:
+                callback(self.profile.ui_preferences)
+            except Exception as e:
+                print(f"Warning: ui_preferences listener failed: {e}")
+    
     def analyze_and_update(self, user_input, assistant_response=""):
         """Analyze interaction and update personality profile."""
-        # Create analysis prompt with current profile context
-        current_profile = json.dumps(self.profile.to_dict(), indent=2)
+        return self.analyze_interactions([(user_input, assistant_response)])
+    
+    def analyze_interactions(self, interactions):
+        """Analyze one or more (user_input, assistant_response) turns in a single call."""
+        # Create analysis prompt with a compact view of the current profile
+        current_profile = json.dumps(self.profile.to_prompt_dict(), separators=(",", ":"))
+        transcript = "\n".join(
+            f"User: {user_input}\nAssistant: {assistant_response}"
+            for user_input, assistant_response in interactions
+        )
+        # The schema below takes ~400 tokens; the transcript gets what's left
+        available = self.max_prompt_tokens - estimate_tokens(current_profile) - 400
+        transcript = truncate_to_tokens(transcript, max(available, 0))
         
         analysis_prompt = f"""
         Current User Profile:
         {current_profile}
         
         New Interaction:
-        User: {user_input}
-        Assistant: {assistant_response}
+        {transcript}
         
-        Please analyze this interaction and update the personality profile. 
-        Return ONLY a valid JSON object with the updated profile including:
+        Report the evidence this interaction gives about the user. Include only traits
+        and fields the interaction actually says something about.
+        Return ONLY a valid JSON object shaped like:
         {{
-            "traits": {{
-                "openness": 0.0-1.0,
-                "conscientiousness": 0.0-1.0,
-                "extraversion": 0.0-1.0,
-                "agreeableness": 0.0-1.0,
-                "neuroticism": 0.0-1.0,
-                "communication_directness": 0.0-1.0,
-                "technical_aptitude": 0.0-1.0
-            }},
-            "preferences": {{
-                "detail_level": "high/medium/low",
-                "response_length": "brief/moderate/detailed",
-                "formality": "casual/professional/mixed",
-                "examples_preferred": true/false
+            "trait_evidence": {{
+                "<trait>": {{"value": 0.0-1.0, "confidence": 0.0-1.0}}
             }},
-            "communication_style": {{
-                "tone": "friendly/professional/direct/supportive",
-                "pace": "fast/moderate/slow",
-                "complexity": "simple/moderate/complex"
-            }},
-            "ui_preferences": {{
-                "color_scheme": "light/dark/auto",
-                "layout": "minimal/standard/detailed",
-                "animation_level": "none/subtle/full",
-                "information_density": "low/medium/high"
-            }},
-            "confidence_scores": {{
-                "traits": 0.0-1.0,
-                "preferences": 0.0-1.0,
-                "communication_style": 0.0-1.0,
-                "ui_preferences": 0.0-1.0
-            }}
+            "preferences": {{"<field>": "<new value>"}},
+            "communication_style": {{"<field>": "<new value>"}},
+            "ui_preferences": {{"<field>": "<new value>"}},
+            "confidence": {{"preferences": 0.0-1.0, "communication_style": 0.0-1.0, "ui_preferences": 0.0-1.0}}
         }}
+        Traits: {", ".join(TRAIT_NAMES)}.
+        preferences: detail_level (high/medium/low), response_length (brief/moderate/detailed),
+        formality (casual/professional/mixed), examples_preferred (true/false).
+        communication_style: tone (friendly/professional/direct/supportive), pace (fast/moderate/slow),
+        complexity (simple/moderate/complex).
+        ui_preferences: color_scheme (light/dark/auto), layout (minimal/standard/detailed),
+        animation_level (none/subtle/full), information_density (low/medium/high).
         """
         
         try:
-            response = self.agent.run(analysis_prompt)
-            response_text = response.content if hasattr(response, "content") else str(response)
+            evidence, _ = run_for_json(self.agent, analysis_prompt)
             
-            # Try to extract JSON from response
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                updated_profile = json.loads(json_str)
-                
-                # Update profile with new data
-                self.profile.from_dict(updated_profile)
+            if evidence is not None:
+                # Blend the evidence into the stored profile
+                previous_ui_preferences = self.profile.ui_preferences
+                self.profile.apply_evidence(evidence)
+                self._notify_ui_preferences_change(previous_ui_preferences)
                 
-                # Add interaction to history
-                self.profile.interaction_history.append({
-                    "user_input": user_input[:200],  # Truncate for storage
-                    "assistant_response": assistant_response[:200],
-                    "timestamp": str(os.times())
-                })
+                # Add interactions to history
+                for user_input, assistant_response in interactions:
+                    self.profile.interaction_history.append({
+                        "user_input": user_input[:200],  # Truncate for storage
+                        "assistant_response": assistant_response[:200],
+                        "timestamp": str(os.times())
+                    })
                 
                 # Save updated profile
                 self.save_profile()
@@ -188,6 +301,6 @@ class DynamicPersonalityAgent:
         
         return suggestions
 
-def create_personality_agent(provider, model_name, api_key):
+def create_personality_agent(provider, model_name, api_key, **options):
     """Create the enhanced dynamic personality agent."""
-    return DynamicPersonalityAgent(provider, model_name, api_key)
+    return DynamicPersonalityAgent(provider, model_name, api_key, **options)
@@ -0,0 +1,179 @@
+# agents/rate_limit.py
+import random
+import threading
+import time
+from backend.utils.token_budget import estimate_tokens
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+class RateLimitTimeout(RuntimeError):
+    """Raised when a call would have to queue longer than the limiter allows."""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute / 60` per second.
+
+    Callers reserve their amount up front and the balance may go negative;
+    each caller then sleeps off its share of the deficit. Waiters are thus
+    served in arrival order without polling, and the sustained rate stays
+    at the budget.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take `amount` now; returns the seconds the caller must wait before using it."""
+        amount = min(amount, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return max(-self.tokens / self.rate, 0.0)
+
+    def refund(self, amount):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+
+class ProviderLimiter:
+    """Requests-per-minute and tokens-per-minute budget for one provider account."""
+
+    def __init__(self, rpm=None, tpm=None, max_wait=5.0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.counters = {"calls": 0, "queued": 0, "rejected": 0, "retries": 0, "wait_seconds": 0.0}
+
+    def acquire(self, tokens):
+        """Block until a call of ~`tokens` tokens fits both budgets (backpressure)."""
+        reserved = [(bucket, amount) for bucket, amount in ((self.requests, 1), (self.tokens, tokens)) if bucket]
+        wait = max([bucket.reserve(amount) for bucket, amount in reserved], default=0.0)
+        if wait > self.max_wait:
+            for bucket, amount in reserved:
+                bucket.refund(amount)
+            self.count("rejected")
+            raise RateLimitTimeout(f"Rate limit queue wait of {wait:.1f}s exceeds {self.max_wait:.1f}s")
+        self.count("calls")
+        if wait > 0:
+            self.count("queued")
+            self.count("wait_seconds", wait)
+            time.sleep(wait)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+def is_retryable(error):
+    """Rate limits, timeouts, connection drops and 5xx responses are worth retrying."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    name = type(error).__name__
+    return any(marker in name for marker in ("RateLimit", "Timeout", "Connection"))
+
+
+def retry_after(error):
+    """Seconds requested by a Retry-After header, if the error (or the SDK error agno wrapped) carries one."""
+    for candidate in (error, error.__cause__):
+        headers = getattr(getattr(candidate, "response", None), "headers", None) or {}
+        try:
+            return float(headers.get("retry-after"))
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base * 2^attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def _prompt_tokens(args, kwargs):
+    messages = kwargs.get("messages", args[0] if args else None)
+    if not isinstance(messages, list):
+        return 0
+    return sum(estimate_tokens(str(getattr(message, "content", message) or "")) for message in messages)
+
+
+class RateLimitedModel:
+    """agno model wrapper that applies a ProviderLimiter and retries transient errors.
+
+    Each call reserves one request plus its estimated prompt tokens and
+    `completion_tokens` before it is sent. Retryable errors are retried up
+    to `max_retries` times with jittered exponential backoff, honouring
+    Retry-After (a Retry-After beyond `max_delay` fails the call instead);
+    streams are only retried before their first chunk. The wrapped model's
+    own client retries should be off, or each attempt sends several requests.
+    """
+
+    def __init__(self, model, limiter, max_retries=4, base_delay=0.5, max_delay=5.0, completion_tokens=512):
+        object.__setattr__(self, "model", model)
+        object.__setattr__(self, "limiter", limiter)
+        object.__setattr__(self, "max_retries", max_retries)
+        object.__setattr__(self, "base_delay", base_delay)
+        object.__setattr__(self, "max_delay", max_delay)
+        object.__setattr__(self, "completion_tokens", completion_tokens)
+
+    def _sleep_before_retry(self, error, attempt):
+        if attempt >= self.max_retries or not is_retryable(error):
+            raise error
+        delay = retry_after(error)
+        if delay is not None and delay > self.max_delay:
+            raise error
+        self.limiter.count("retries")
+        time.sleep(delay if delay is not None else backoff_delay(attempt, self.base_delay, self.max_delay))
+
+    def response(self, *args, **kwargs):
+        tokens = _prompt_tokens(args, kwargs) + self.completion_tokens
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            try:
+                return self.model.response(*args, **kwargs)
+            except Exception as e:
+                self._sleep_before_retry(e, attempt)
+                attempt += 1
+
+    def response_stream(self, *args, **kwargs):
+        tokens = _prompt_tokens(args, kwargs) + self.completion_tokens
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            chunks = self.model.response_stream(*args, **kwargs)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                return
+            except Exception as e:
+                self._sleep_before_retry(e, attempt)
+                attempt += 1
+                continue
+            yield first
+            yield from chunks
+            return
+
+    def __deepcopy__(self, memo):
+        # agno deep-copies an agent's model for its memory; the copy must
+        # keep using the same limiter (and its locks), so share this instance
+        return self
+
+    def __getattr__(self, name):
+        if name.startswith("__") or "model" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.model, name, value)
@@ -0,0 +1,288 @@
+# agents/router.py
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from backend.agents import model_registry
+
+# Calls are routed per request; these methods change model setup and go to every route
+FAN_OUT_PREFIXES = ("add_", "set_", "deactivate_", "clear")
+
+# Threads for hedged attempts; a losing attempt finishes in the background
+hedge_pool = ThreadPoolExecutor(max_workers=int(os.getenv("MODEL_ROUTER_HEDGE_WORKERS", "8")))
+
+
+class ProviderHealth:
+    """Rolling latency and error window for one route."""
+
+    def __init__(self, window=50):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.last_error_at = None
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self.lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(latency)
+            else:
+                self.last_error_at = time.monotonic()
+
+    @property
+    def samples(self):
+        return len(self.outcomes)
+
+    def error_rate(self):
+        with self.lock:
+            return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def mean_latency(self):
+        with self.lock:
+            return float(np.mean(self.latencies)) if self.latencies else 0.0
+
+    def latency_quantile(self, quantile):
+        with self.lock:
+            return float(np.quantile(self.latencies, quantile)) if self.latencies else None
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "error_rate": self.error_rate(),
+            "mean_latency": self.mean_latency(),
+            "p95_latency": self.latency_quantile(0.95)
+        }
+
+
+class RouteHealth:
+    """Health windows keyed by route name, shareable between routed models."""
+
+    def __init__(self, window=50):
+        self.window = window
+        self.providers = {}
+        self.lock = threading.Lock()
+        self.counters = {"hedges": 0, "failovers": 0}
+
+    def get(self, name):
+        with self.lock:
+            health = self.providers.get(name)
+            if health is None:
+                health = self.providers[name] = ProviderHealth(self.window)
+            return health
+
+    def count(self, event):
+        with self.lock:
+            self.counters[event] += 1
+
+    def stats(self):
+        with self.lock:
+            providers = dict(self.providers)
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "providers": {name: health.stats() for name, health in providers.items()}
+        }
+
+
+def _messages_arg(args, kwargs):
+    if "messages" in kwargs:
+        return kwargs["messages"]
+    return args[0] if args and isinstance(args[0], list) else None
+
+
+def _with_messages(args, kwargs, messages):
+    if "messages" in kwargs:
+        return args, {**kwargs, "messages": messages}
+    return (messages, *args[1:]), kwargs
+
+
+class RoutedModel:
+    """agno model stand-in that spreads calls over several provider models.
+
+    Each call goes to the fastest healthy route (lowest rolling mean
+    latency); on an error the next route is tried. A route whose error rate
+    exceeds `max_error_rate` is skipped until `recovery_seconds` after its
+    last failure. With `hedge` enabled, if the chosen route hasn't answered
+    within its `hedge_quantile` latency a second route is raced against it.
+
+    Every attempt gets its own copy of the message list; only the winning
+    attempt's messages are written back, so failed or losing calls never
+    leave partial turns behind.
+    """
+
+    def __init__(self, routes, health=None, hedge=False, hedge_quantile=0.95, max_error_rate=0.5,
+                 min_samples=5, recovery_seconds=30):
+        if not routes:
+            raise ValueError("RoutedModel needs at least one route")
+        # Plain attribute writes are forwarded to the routes (see __setattr__)
+        object.__setattr__(self, "routes", list(routes))
+        object.__setattr__(self, "health", health or RouteHealth())
+        object.__setattr__(self, "hedge", hedge)
+        object.__setattr__(self, "hedge_quantile", hedge_quantile)
+        object.__setattr__(self, "max_error_rate", max_error_rate)
+        object.__setattr__(self, "min_samples", min_samples)
+        object.__setattr__(self, "recovery_seconds", recovery_seconds)
+
+    def _healthy(self, health):
+        if health.samples < self.min_samples or health.error_rate() <= self.max_error_rate:
+            return True
+        return time.monotonic() - health.last_error_at >= self.recovery_seconds
+
+    def ranked_routes(self):
+        """Routes in the order they should be tried: healthy by latency, then the rest by error rate."""
+        healthy, unhealthy = [], []
+        for name, model in self.routes:
+            health = self.health.get(name)
+            if self._healthy(health):
+                healthy.append((health.mean_latency(), name, model))
+            else:
+                unhealthy.append((health.error_rate(), name, model))
+        return [(name, model) for _, name, model in sorted(healthy, key=lambda r: r[0])] + \
+               [(name, model) for _, name, model in sorted(unhealthy, key=lambda r: r[0])]
+
+    def _attempt(self, route, args, kwargs, messages):
+        name, model = route
+        attempt_messages = list(messages) if messages is not None else None
+        if attempt_messages is not None:
+            args, kwargs = _with_messages(args, kwargs, attempt_messages)
+        start = time.perf_counter()
+        try:
+            result = model.response(*args, **kwargs)
+        except Exception:
+            self.health.get(name).record(time.perf_counter() - start, False)
+            raise
+        self.health.get(name).record(time.perf_counter() - start, True)
+        return attempt_messages, result
+
+    def response(self, *args, **kwargs):
+        messages = _messages_arg(args, kwargs)
+        candidates = self.ranked_routes()
+        error = None
+        position = 0
+        while position < len(candidates):
+            if position > 0:
+                self.health.count("failovers")
+            primary = candidates[position]
+            position += 1
+            delay = None
+            primary_health = self.health.get(primary[0])
+            if self.hedge and position < len(candidates) and primary_health.samples >= self.min_samples:
+                delay = primary_health.latency_quantile(self.hedge_quantile)
+
+            if delay is None:
+                try:
+                    attempt_messages, result = self._attempt(primary, args, kwargs, messages)
+                except Exception as e:
+                    error = e
+                    continue
+                if messages is not None:
+                    messages[:] = attempt_messages
+                return result
+
+            pending = {hedge_pool.submit(self._attempt, primary, args, kwargs, messages)}
+            done, _ = wait(pending, timeout=delay)
+            if not done:
+                self.health.count("hedges")
+                pending.add(hedge_pool.submit(self._attempt, candidates[position], args, kwargs, messages))
+                position += 1
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        attempt_messages, result = future.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    if messages is not None:
+                        messages[:] = attempt_messages
+                    return result
+        raise error
+
+    def response_stream(self, *args, **kwargs):
+        """Stream from the best route, failing over only until the first chunk arrives."""
+        messages = _messages_arg(args, kwargs)
+        error = None
+        for position, (name, model) in enumerate(self.ranked_routes()):
+            if position > 0:
+                self.health.count("failovers")
+            attempt_messages = list(messages) if messages is not None else None
+            call_args, call_kwargs = (_with_messages(args, kwargs, attempt_messages)
+                                      if attempt_messages is not None else (args, kwargs))
+            start = time.perf_counter()
+            chunks = model.response_stream(*call_args, **call_kwargs)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                self.health.get(name).record(time.perf_counter() - start, True)
+                if messages is not None:
+                    messages[:] = attempt_messages
+                return
+            except Exception as e:
+                self.health.get(name).record(time.perf_counter() - start, False)
+                error = e
+                continue
+            # Time to first chunk is what a streaming caller waits on
+            self.health.get(name).record(time.perf_counter() - start, True)
+            yield first
+            try:
+                yield from chunks
+            except Exception:
+                self.health.get(name).record(time.perf_counter() - start, False)
+                raise
+            if messages is not None:
+                messages[:] = attempt_messages
+            return
+        raise error
+
+    def __deepcopy__(self, memo):
+        # agno deep-copies an agent's model for its memory; the copy should
+        # share the routes and health (and their locks) rather than clone them
+        return self
+
+    def __getattr__(self, name):
+        if name.startswith("__") or "routes" not in self.__dict__:
+            raise AttributeError(name)
+        if name.startswith(FAN_OUT_PREFIXES):
+            methods = [getattr(model, name) for _, model in self.routes]
+
+            def fan_out(*args, **kwargs):
+                results = [method(*args, **kwargs) for method in methods]
+                return results[0]
+            return fan_out
+        # Everything else (ids, async calls, helpers) comes from the best route
+        return getattr(self.ranked_routes()[0][1], name)
+
+    def __setattr__(self, name, value):
+        for _, model in self.routes:
+            setattr(model, name, value)
+
+
+def _route_model(route, retry=True):
+    api_key = route.get("api_key") or os.getenv(route.get("api_key_env", ""), "")
+    params = {"base_url": route["base_url"]} if route.get("base_url") else {}
+    return model_registry.create_model_instance(route["provider"], route["model"], api_key, retry=retry, **params)
+
+
+def create_routed_model(routes, health=None, **options):
+    """Build a RoutedModel from route configs.
+
+    Each route is a dict with `provider`, `model` and either `api_key` or
+    `api_key_env`; an optional `base_url` points the route at any
+    OpenAI-compatible endpoint, e.g. a local fake server in tests. Routes
+    don't retry on their own: failing over to the next route is the retry.
+    """
+    built = [
+        (route.get("name") or f"{route['provider']}:{route['model']}", _route_model(route, retry=False))
+        for route in routes
+    ]
+    return RoutedModel(built, health=health, **options)
+
+
+def create_agent_model(config, health=None, **options):
+    """Model for one agent from its tier config: a route dict, or a list of routes to route over."""
+    if isinstance(config, list):
+        return create_routed_model(config, health=health, **options)
+    return _route_model(config)
@@ -1,15 +1,19 @@
 from agno.agent import Agent
-from backend.agents.base import create_model_instance
+from backend.agents.base import create_model_instance, run_for_json
+from backend.services.task_extraction import parse_tasks_from_response
 from backend.storage.loader import load_task_storage
-import json
+from backend.utils.cache import normalize_text, stable_hash
+from backend.utils.token_budget import estimate_tokens, truncate_to_tokens
 
 class AdaptiveTaskAgent:
-    def __init__(self, provider, model_name, api_key):
+    def __init__(self, provider, model_name, api_key, model=None, user_id=None, history_turns=0, max_prompt_tokens=2000, cache=None):
         self.agent = Agent(
             name="Adaptive Task Agent",
             role="Extract and format tasks based on user personality and preferences.",
-            model=create_model_instance(provider, model_name, api_key),
-            add_history_to_messages=True,
+            model=model or create_model_instance(provider, model_name, api_key),
+            user_id=user_id,
+            add_history_to_messages=history_turns > 0,
+            num_history_responses=history_turns,
             storage=load_task_storage(),
             instructions="""
                 You are an adaptive task extraction agent. Extract actionable tasks from conversations
@@ -24,7 +28,7 @@ class AdaptiveTaskAgent:
                             "priority": "high/medium/low",
                             "estimated_time": "time estimate",
                             "category": "work/personal/learning/etc",
-                            "due_date": "suggested due date if applicable",
+                            "due_date": "due date as YYYY-MM-DD (or YYYY-MM-DDTHH:MM) if applicable",
                             "subtasks": ["subtask1", "subtask2"] // if complex task
                         }
                     ],
@@ -36,16 +40,48 @@ class AdaptiveTaskAgent:
             stream=False,
         )
         self.personality_profile = {}
+        self.max_prompt_tokens = max_prompt_tokens
+        # Optional utils.cache.TieredCache of extraction results, namespaced by adaptations;
+        # it may be shared by every user, so entries are never purged per user
+        self.cache = cache
     
     def update_personality_context(self, personality_data):
         """Update the personality context for task adaptation."""
         self.personality_profile = personality_data
     
+    @staticmethod
+    def cache_namespace(personality_adaptations):
+        return stable_hash(personality_adaptations or {})
+    
+    def get_cache_stats(self):
+        return self.cache.stats() if self.cache is not None else None
+    
     def extract_tasks(self, user_input, personality_adaptations=None):
-        """Extract tasks with personality-based adaptations."""
+        """Extract tasks with personality-based adaptations.
+        
+        Successful extractions are cached by normalized input and adaptations;
+        fallback and error results are not, so a retry reaches the model again.
+        """
         if personality_adaptations is None:
             personality_adaptations = {}
         
+        if self.cache is None:
+            task_data, _ = self._extract_tasks(user_input, personality_adaptations)
+            return task_data
+        
+        namespace = self.cache_namespace(personality_adaptations)
+        key = stable_hash(normalize_text(user_input))
+        task_data = self.cache.get(namespace, key)
+        if task_data is not None:
+            return task_data
+        
+        task_data, cacheable = self._extract_tasks(user_input, personality_adaptations)
+        if cacheable:
+            self.cache.set(namespace, key, task_data)
+        return task_data
+    
+    def _extract_tasks(self, user_input, personality_adaptations):
+        """Run the extraction; returns (task_data, cacheable)."""
         # Build personality-aware prompt
         adaptation_context = ""
         if personality_adaptations:
@@ -66,6 +102,10 @@ class AdaptiveTaskAgent:
             - If deadline_sensitivity is "high": Suggest specific deadlines and time management tips
             """
         
+        # Keep very long inputs inside the agent's prompt budget
+        available = self.max_prompt_tokens - estimate_tokens(adaptation_context) - 100
+        user_input = truncate_to_tokens(user_input, max(available, 0))
+        
         full_prompt = f"""
         {adaptation_context}
         
@@ -75,23 +115,26 @@ class AdaptiveTaskAgent:
         """
         
         try:
-            response = self.agent.run(full_prompt)
-            response_text = response.content if hasattr(response, "content") else str(response)
-            
-            # Try to extract JSON from response
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
+            task_data, response_text = run_for_json(self.agent, full_prompt)
+            if task_data is not None:
+                return task_data, True
             
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                return json.loads(json_str)
+            # Fall back to a markdown task list if the model ignored the JSON format
+            listed_tasks = parse_tasks_from_response(response_text)
+            if listed_tasks:
+                return {
+                    "tasks": [{"title": task, "description": task} for task in listed_tasks],
+                    "summary": f"Extracted {len(listed_tasks)} tasks from a task list",
+                    "recommendations": ""
+                }, True
             else:
                 # Fallback to simple task extraction
                 return {
-                    "tasks": [{"title": "Process user request", "description": user_input}],
+                    # Marked so storage skips it; it isn't a real task
+                    "tasks": [{"title": "Process user request", "description": user_input, "placeholder": True}],
                     "summary": "Could not parse structured tasks",
                     "recommendations": "Please rephrase your request for better task extraction"
-                }
+                }, False
                 
         except Exception as e:
             print(f"Error in task extraction: {e}")
@@ -99,8 +142,8 @@ class AdaptiveTaskAgent:
                 "tasks": [],
                 "summary": "Error in task extraction",
                 "recommendations": "Please try again with a clearer request"
-            }
+            }, False
 
-def create_task_agent(provider, model_name, api_key):
+def create_task_agent(provider, model_name, api_key, **options):
     """Create the enhanced adaptive task agent."""
-    return AdaptiveTaskAgent(provider, model_name, api_key)
+    return AdaptiveTaskAgent(provider, model_name, api_key, **options)
@@ -1,15 +1,111 @@
 from agno.agent import Agent
-from backend.agents.base import create_model_instance
+from backend.agents.base import create_model_instance, run_for_json
 from backend.storage.loader import load_session_storage
-import json
+from backend.utils.cache import LRUCache, normalize_text, stable_hash
+from backend.utils.token_budget import truncate_to_tokens
+import copy
+import re
+
+# Rule tables mapping each ui_adaptations enum value onto the parts of the
+# default config it overrides. Unknown values fall back to the defaults.
+COLOR_SCHEME_RULES = {
+    "light": {
+        "theme": {"colorScheme": "light"}
+    },
+    "dark": {
+        "theme": {
+            "colorScheme": "dark",
+            "primaryColor": "#60a5fa",
+            "secondaryColor": "#94a3b8",
+            "backgroundColor": "#111827",
+            "textColor": "#f9fafb",
+            "accentColor": "#34d399"
+        }
+    },
+    "auto": {
+        "theme": {"colorScheme": "auto"}
+    }
+}
+
+LAYOUT_RULES = {
+    "minimal": {
+        "layout": {"type": "minimal", "sidebar": False, "headerStyle": "compact", "contentLayout": "single-column"},
+        "components": {
+            "chatInterface": {"style": "linear", "showPersonalityInsights": False},
+            "personalityPanel": {"visible": False, "position": "modal", "detailLevel": "summary"}
+        },
+        "responsive": {"mobileLayout": "stack"}
+    },
+    "standard": {
+        "layout": {"type": "standard"}
+    },
+    "detailed": {
+        "layout": {"type": "detailed", "sidebar": True, "headerStyle": "prominent", "contentLayout": "three-column"},
+        "components": {
+            "chatInterface": {"style": "card"},
+            "taskDisplay": {"viewType": "kanban", "groupBy": "category"},
+            "personalityPanel": {"visible": True, "position": "inline", "detailLevel": "full"}
+        },
+        "responsive": {"mobileLayout": "tabs"}
+    }
+}
+
+ANIMATION_RULES = {
+    "none": {
+        "animations": {"level": "none", "transitionDuration": "fast", "enableHover": False, "enablePageTransitions": False}
+    },
+    "subtle": {
+        "animations": {"level": "subtle", "transitionDuration": "normal", "enableHover": True, "enablePageTransitions": True}
+    },
+    "full": {
+        "animations": {"level": "full", "transitionDuration": "slow", "enableHover": True, "enablePageTransitions": True}
+    }
+}
+
+INFORMATION_DENSITY_RULES = {
+    "low": {
+        "components": {
+            "chatInterface": {"showTimestamps": False, "messageSpacing": "spacious"},
+            "taskDisplay": {"showDeadlines": False}
+        }
+    },
+    "medium": {
+        "components": {
+            "chatInterface": {"messageSpacing": "normal"}
+        }
+    },
+    "high": {
+        "components": {
+            "chatInterface": {"showTimestamps": True, "messageSpacing": "compact"},
+            "taskDisplay": {"showPriority": True, "showDeadlines": True}
+        }
+    }
+}
+
+# Context phrases that ask for something the rule tables can't express
+CUSTOM_LAYOUT_PATTERN = re.compile(
+    r"\b(custom|redesign|rearrange|reorganize|restyle|layout|dashboard|colou?rs?|palette|theme|move the|put the)\b",
+    re.IGNORECASE
+)
+
+def _deep_merge(base, overrides):
+    """Recursively merge `overrides` into `base` in place."""
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _deep_merge(base[key], value)
+        else:
+            base[key] = value
+    return base
 
 class GenerativeUIAgent:
-    def __init__(self, provider, model_name, api_key):
+    def __init__(self, provider, model_name, api_key, llm_mode="auto", cache_size=256, cache_ttl=900, model=None, user_id=None, history_turns=0, max_prompt_tokens=3000):
         self.agent = Agent(
             name="Generative UI Agent",
             role="Generate adaptive UI configurations based on user personality and context.",
-            model=create_model_instance(provider, model_name, api_key),
-            add_history_to_messages=True,
+            model=model or create_model_instance(provider, model_name, api_key),
+            user_id=user_id,
+            add_history_to_messages=history_turns > 0,
+            num_history_responses=history_turns,
             storage=load_session_storage(),
             instructions="""
                 You are a generative UI agent that creates adaptive user interfaces based on personality profiles.
@@ -28,16 +124,80 @@ class GenerativeUIAgent:
             stream=False,
         )
         self.personality_profile = {}
+        # "never" always uses the rule engine, "always" always asks the LLM,
+        # "auto" asks the LLM only when the context requests a custom layout
+        self.llm_mode = llm_mode
+        self.max_prompt_tokens = max_prompt_tokens
+        # Generated configs keyed by hashes of the adaptations and normalized context;
+        # cleared whenever the profile's ui_preferences change
+        self.config_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
     
     def update_personality_context(self, personality_data):
         """Update the personality context for UI generation."""
         self.personality_profile = personality_data
     
-    def generate_ui_config(self, context="", ui_adaptations=None):
+    def invalidate_cache(self, *_):
+        """Drop all cached configurations (called when ui_preferences change)."""
+        self.config_cache.clear()
+    
+    def get_cache_stats(self):
+        """Return hit/miss counters for the config cache."""
+        return self.config_cache.stats()
+    
+    def should_use_llm(self, context=""):
+        """Decide whether a request needs the LLM rather than the rule engine."""
+        if self.llm_mode == "always":
+            return True
+        if self.llm_mode == "auto":
+            return bool(context and CUSTOM_LAYOUT_PATTERN.search(context))
+        return False
+    
+    def build_ui_config(self, ui_adaptations=None):
+        """Build a UI configuration locally from the enumerated ui_adaptations."""
+        ui_adaptations = ui_adaptations or {}
+        config = self.get_default_ui_config()
+        
+        rule_sets = (
+            (COLOR_SCHEME_RULES, "color_scheme"),
+            (LAYOUT_RULES, "layout"),
+            (ANIMATION_RULES, "animation_level"),
+            (INFORMATION_DENSITY_RULES, "information_density"),
+        )
+        for rules, field in rule_sets:
+            overrides = rules.get(str(ui_adaptations.get(field, "")).lower())
+            if overrides:
+                _deep_merge(config, copy.deepcopy(overrides))
+        
+        return config
+    
+    def generate_ui_config(self, context="", ui_adaptations=None, use_llm=None):
         """Generate UI configuration based on personality and context."""
         if ui_adaptations is None:
             ui_adaptations = {}
         
+        if use_llm is None:
+            use_llm = self.should_use_llm(context)
+        
+        cache_key = ("ui_config", stable_hash(ui_adaptations), stable_hash(normalize_text(context)), use_llm)
+        cached = self.config_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        config = self._generate_llm_ui_config(context, ui_adaptations) if use_llm else None
+        if config is None:
+            config = self.build_ui_config(ui_adaptations)
+            if use_llm:
+                # Don't pin a fallback; the next request retries the LLM
+                return config
+        
+        self.config_cache.set(cache_key, config)
+        return config
+    
+    def _generate_llm_ui_config(self, context, ui_adaptations):
+        """Ask the LLM for a custom configuration; returns None on failure."""
+        # The schema prompt itself is ~900 tokens; context gets the remainder
+        context = truncate_to_tokens(context, max(self.max_prompt_tokens - 900, 0))
+        
         # Build personality-aware UI generation prompt
         adaptation_context = ""
         if ui_adaptations:
@@ -122,23 +282,17 @@ class GenerativeUIAgent:
         """
         
         try:
-            response = self.agent.run(full_prompt)
-            response_text = response.content if hasattr(response, "content") else str(response)
+            config, _ = run_for_json(self.agent, full_prompt)
             
-            # Try to extract JSON from response
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                return json.loads(json_str)
+            if config is not None:
+                return config
             else:
-                # Fallback to default configuration
-                return self.get_default_ui_config()
+                print("Warning: Could not extract JSON from UI generation")
+                return None
                 
         except Exception as e:
             print(f"Error in UI generation: {e}")
-            return self.get_default_ui_config()
+            return None
     
     def get_default_ui_config(self):
         """Return a default UI configuration."""
@@ -191,6 +345,11 @@ class GenerativeUIAgent:
     
     def generate_component_config(self, component_type, context=""):
         """Generate specific component configuration."""
+        cache_key = ("component", component_type, stable_hash(normalize_text(context)))
+        cached = self.config_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         prompt = f"""
         Generate a specific configuration for a {component_type} component.
         Context: {context}
@@ -199,15 +358,11 @@ class GenerativeUIAgent:
         """
         
         try:
-            response = self.agent.run(prompt)
-            response_text = response.content if hasattr(response, "content") else str(response)
-            
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
+            config, _ = run_for_json(self.agent, prompt)
             
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                return json.loads(json_str)
+            if config is not None:
+                self.config_cache.set(cache_key, config)
+                return config
             else:
                 return {"error": "Could not generate component configuration"}
                 
@@ -215,6 +370,6 @@ class GenerativeUIAgent:
             print(f"Error generating component config: {e}")
             return {"error": str(e)}
 
-def create_ui_agent(provider, model_name, api_key):
+def create_ui_agent(provider, model_name, api_key, **options):
     """Create the generative UI agent."""
-    return GenerativeUIAgent(provider, model_name, api_key)
\ No newline at end of file
+    return GenerativeUIAgent(provider, model_name, api_key, **options)
\ No newline at end of file
@@ -13,6 +13,40 @@ class Settings(BaseSettings):
     ENV: str = "dev"
     FRONTEND_ORIGIN: str = "http://localhost:5173"
     DATABASE_URL: str = "sqlite+aiosqlite:///./paragomus.db"
+    AGENT_MAX_CONCURRENCY: int = 8
+    AGENT_POOL_SIZE: int = 64
+    PERSONALITY_UPDATE_MODE: str = "inline"  # "inline" or "background"
+    PERSONALITY_DEBOUNCE_SECONDS: float = 2.0
+    UI_CONFIG_LLM_MODE: str = "auto"  # "never", "auto" or "always"
+    UI_CACHE_SIZE: int = 256
+    UI_CACHE_TTL_SECONDS: float = 900
+    TASK_CACHE_SIZE: int = 512
+    TASK_CACHE_DISK_SIZE: int = 10000
+    TASK_CACHE_TTL_SECONDS: float = 86400
+    TASK_GATE_THRESHOLD: float = 0.4
+    TASK_BATCH_CONCURRENCY: int = 4
+    TASK_BATCH_MAX_ITEMS: int = 5000
+    CHAT_CACHE_ENABLED: bool = False
+    CHAT_CACHE_SIZE: int = 512
+    CHAT_CACHE_SIMILARITY: float = 0.8
+    # Extra provider routes, e.g. [{"provider": "Groq", "model": "llama-3.1-8b-instant", "api_key_env": "GROQ_API_KEY"}];
+    # when set, calls go to the fastest healthy route with failover
+    MODEL_ROUTES: list[dict] = []
+    MODEL_ROUTER_HEDGE: bool = False
+    MODEL_ROUTER_HEDGE_QUANTILE: float = 0.95
+    MODEL_ROUTER_WINDOW: int = 50
+    MODEL_ROUTER_MAX_ERROR_RATE: float = 0.5
+    MODEL_ROUTER_RECOVERY_SECONDS: float = 30
+    # Per-agent model tiers keyed by role (chat/task/personality/ui): a route dict as in
+    # MODEL_ROUTES, or a list of them to route over; roles not listed use the default model
+    AGENT_MODELS: dict[str, dict | list[dict]] = {}
+    # Per-agent history turns resent by agno and prompt token budgets (JSON in env)
+    AGENT_HISTORY_TURNS: dict[str, int] = {"chat": 6, "task": 0, "personality": 0, "ui": 0}
+    AGENT_PROMPT_TOKEN_BUDGETS: dict[str, int] = {"chat": 6000, "task": 2000, "personality": 2500, "ui": 3000}
+    # Contexts above this size are chunked and only the top-k relevant chunks are sent
+    CONTEXT_RETRIEVAL_THRESHOLD_TOKENS: int = 1500
+    CONTEXT_CHUNK_WORDS: int = 220
+    CONTEXT_TOP_K: int = 5
 
     model_config = {"env_file": ".env", "extra": "ignore"}
 
@@ -1,13 +1,17 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 from storage.loader import init_db
+from storage.task_db import list_tasks, iter_tasks, normalize_due_date, save_extracted_tasks
 from api.config import settings
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 import json
 import asyncio
-from core.agent_manager import AgentManager
+from agents.base import close_model_clients
+from core.executor import AgentExecutor
+from core.manager_pool import AgentManagerPool
 from dotenv import load_dotenv
 import os
 
@@ -31,12 +35,25 @@ app.add_middleware(
 async def startup():
     await init_db()
 
-# Global agent manager instance
-agent_manager = None
+@app.on_event("shutdown")
+async def shutdown():
+    if agent_pool is not None:
+        # Persists every pooled profile and flushes the profile store
+        agent_pool.close_all()
+    agent_executor.shutdown(wait=False)
+    close_model_clients()
 
-def get_agent_manager():
-    global agent_manager
-    if agent_manager is None:
+# Per-user agent managers, built lazily and evicted by LRU
+agent_pool = None
+
+# Shared pool for blocking agent calls; bounds concurrent LLM requests
+agent_executor = AgentExecutor(settings.AGENT_MAX_CONCURRENCY)
+
+DEFAULT_USER_ID = "default"
+
+def get_agent_pool():
+    global agent_pool
+    if agent_pool is None:
         provider = "Perplexity"
         model = "sonar"
         api_key = os.getenv("PERPLEXITY_API_KEY")
@@ -44,9 +61,34 @@ def get_agent_manager():
         if not api_key:
             raise HTTPException(status_code=500, detail="PERPLEXITY_API_KEY not found")
         
-        agent_manager = AgentManager(provider, model, api_key)
+        routes = None
+        if settings.MODEL_ROUTES:
+            routes = [{"provider": provider, "model": model, "api_key": api_key}, *settings.MODEL_ROUTES]
+        
+        agent_pool = AgentManagerPool(
+            provider, model, api_key,
+            executor=agent_executor,
+            max_size=settings.AGENT_POOL_SIZE,
+            routes=routes,
+            route_window=settings.MODEL_ROUTER_WINDOW,
+            router_options={
+                "hedge": settings.MODEL_ROUTER_HEDGE,
+                "hedge_quantile": settings.MODEL_ROUTER_HEDGE_QUANTILE,
+                "max_error_rate": settings.MODEL_ROUTER_MAX_ERROR_RATE,
+                "recovery_seconds": settings.MODEL_ROUTER_RECOVERY_SECONDS
+            },
+            agent_models=settings.AGENT_MODELS
+        )
     
-    return agent_manager
+    return agent_pool
+
+async def get_agent_manager(user_id=DEFAULT_USER_ID):
+    # Building a new user's manager touches SQLite; keep it off the event loop
+    return await get_agent_pool().aget(user_id or DEFAULT_USER_ID)
+
+def current_user_id(x_user_id: Optional[str] = Header(None)) -> str:
+    """Resolve the caller's user id from the X-User-Id header."""
+    return x_user_id or DEFAULT_USER_ID
 
 # Pydantic models
 class ChatMessage(BaseModel):
@@ -63,6 +105,20 @@ class ChatResponse(BaseModel):
 class TaskExtraction(BaseModel):
     text: str
 
+class TaskBatchItem(BaseModel):
+    text: str
+    id: Optional[str] = None
+
+class TaskBatch(BaseModel):
+    texts: List[str | TaskBatchItem]
+
+class TaskFilters(BaseModel):
+    status: Optional[str] = None
+    priority: Optional[str] = None
+    project_id: Optional[str] = None
+    due_after: Optional[str] = None
+    due_before: Optional[str] = None
+
 class UIConfigRequest(BaseModel):
     context: Optional[str] = ""
 
@@ -87,68 +143,183 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+async def persist_extracted_tasks(task_data, user_id):
+    """Store the user's extracted tasks; storage problems never fail the chat itself."""
+    try:
+        await save_extracted_tasks(task_data, user_id)
+    except Exception as e:
+        print(f"Warning: Could not store extracted tasks: {e}")
+    return task_data
+
 # API Routes
 @app.get("/")
 async def root():
     return {"message": "Adaptive AI Assistant API", "version": "1.0.0"}
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage, user_id: str = Depends(current_user_id)):
     """Main chat endpoint with personality adaptation."""
     try:
-        agent = get_agent_manager()
-        
-        # Generate response
-        response = agent.ask(message.message, message.context)
-        
-        # Extract tasks
-        tasks = agent.extract_tasks(message.message)
-        
-        # Get personality profile
-        personality_profile = agent.get_personality_profile()
-        
-        # Get UI configuration
-        ui_config = agent.get_ui_config(message.context)
+        agent = await get_agent_manager(user_id)
         
-        # Get adaptations
-        adaptations = agent.get_adaptation_suggestions()
+        # Run response, task extraction and UI generation as one pipeline
+        result = await agent.achat_pipeline(message.message, message.context)
+        await persist_extracted_tasks(result["tasks"], user_id)
         
-        return ChatResponse(
-            response=response,
-            personality_profile=personality_profile,
-            tasks=tasks,
-            ui_config=ui_config,
-            adaptations=adaptations
-        )
+        return ChatResponse(**result)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream(message: ChatMessage, user_id: str = Depends(current_user_id)):
+    """Server-Sent Events variant of /chat that streams the reply as it is generated."""
+    agent = await get_agent_manager(user_id)
+    
+    async def event_stream():
+        try:
+            async for frame in agent.astream_chat_pipeline(message.message, message.context):
+                if frame["type"] == "tasks":
+                    await persist_extracted_tasks(frame["tasks"], user_id)
+                yield f"event: {frame['type']}\ndata: {json.dumps(frame)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'type': 'error', 'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/extract-tasks")
-async def extract_tasks(extraction: TaskExtraction):
+async def extract_tasks(extraction: TaskExtraction, user_id: str = Depends(current_user_id)):
     """Extract tasks from text."""
     try:
-        agent = get_agent_manager()
-        tasks = agent.extract_tasks(extraction.text)
+        agent = await get_agent_manager(user_id)
+        tasks = await agent.aextract_tasks(extraction.text)
+        
+        # Upsert into the tasks table; the response carries the stored ids
+        await save_extracted_tasks(tasks, user_id)
         return tasks
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def parse_batch_jsonl(raw):
+    """Yield (item, error) per line of a JSONL upload: a JSON string or {"text": ..., "id": ...}."""
+    for line in raw.decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+            yield (TaskBatchItem(text=value) if isinstance(value, str) else TaskBatchItem(**value)), None
+        except Exception as e:
+            yield None, f"Invalid line: {e}"
+
+async def read_task_batch(request: Request):
+    """Batch items from a JSON body ({"texts": [...]} or a bare list) or a multipart `file` upload."""
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None:
+            raise HTTPException(status_code=400, detail="Expected a JSONL upload in the `file` field")
+        items = list(parse_batch_jsonl(await upload.read()))
+    else:
+        try:
+            body = await request.json()
+            batch = TaskBatch(texts=body) if isinstance(body, list) else TaskBatch(**body)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid batch: {e}")
+        items = [(TaskBatchItem(text=text) if isinstance(text, str) else text, None) for text in batch.texts]
+    
+    if len(items) > settings.TASK_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.TASK_BATCH_MAX_ITEMS} items")
+    return items
+
+@app.post("/extract-tasks/batch")
+async def extract_tasks_batch(request: Request, user_id: str = Depends(current_user_id)):
+    """Extract and store tasks for many texts, streaming one NDJSON line per item as it finishes.
+    
+    Each line carries the item's `index` (and `id` if given) plus a `status`
+    of "ok" (with `tasks`), "error" or "invalid"; lines arrive in completion
+    order, not input order.
+    """
+    items = await read_task_batch(request)
+    agent = await get_agent_manager(user_id)
+    pending = iter(enumerate(items))
+    results = asyncio.Queue()
+    
+    async def extract(index, item):
+        result = {"index": index, "id": item.id}
+        try:
+            tasks = await agent.aextract_tasks(item.text)
+            await save_extracted_tasks(tasks, user_id)
+            return {**result, "status": "ok", "tasks": tasks}
+        except Exception as e:
+            return {**result, "status": "error", "error": str(e)}
+    
+    async def worker():
+        # Workers pull items lazily so a large batch never holds thousands of tasks
+        for index, (item, error) in pending:
+            if error is not None:
+                await results.put({"index": index, "id": None, "status": "invalid", "error": error})
+            else:
+                await results.put(await extract(index, item))
+    
+    async def lines():
+        workers = [asyncio.create_task(worker()) for _ in range(min(settings.TASK_BATCH_CONCURRENCY, len(items)))]
+        try:
+            for _ in range(len(items)):
+                yield json.dumps(await results.get()) + "\n"
+        finally:
+            # Client went away or the batch is done; stop any remaining work
+            for task in workers:
+                task.cancel()
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/tasks")
+async def get_tasks(
+    filters: TaskFilters = Depends(),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    user_id: str = Depends(current_user_id)
+):
+    """List the user's stored tasks, keyset-paginated; pass `next_cursor` back as `cursor`."""
+    try:
+        return await list_tasks(user_id, limit=limit, cursor=cursor, **filters.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/tasks/export")
+async def export_tasks(filters: TaskFilters = Depends(), user_id: str = Depends(current_user_id)):
+    """Stream every matching task of the user as NDJSON without loading them all into memory."""
+    # Check the range up front; once streaming starts an error can't become a 400
+    for name in ("due_after", "due_before"):
+        value = getattr(filters, name)
+        if value is not None and normalize_due_date(value) is None:
+            raise HTTPException(status_code=400, detail=f"{name} must be an ISO 8601 date or datetime: {value}")
+    
+    async def rows():
+        async for task in iter_tasks(user_id, **filters.model_dump()):
+            yield json.dumps(task) + "\n"
+    
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
 @app.get("/personality-profile")
-async def get_personality_profile():
+async def get_personality_profile(user_id: str = Depends(current_user_id)):
     """Get current personality profile."""
     try:
-        agent = get_agent_manager()
+        agent = await get_agent_manager(user_id)
         return agent.get_personality_profile()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/ui-config")
-async def get_ui_config(request: UIConfigRequest):
+async def get_ui_config(request: UIConfigRequest, user_id: str = Depends(current_user_id)):
     """Get UI configuration based on personality."""
     try:
-        agent = get_agent_manager()
-        ui_config = agent.get_ui_config(request.context)
+        agent = await get_agent_manager(user_id)
+        ui_config = await agent.aget_ui_config(request.context)
         return ui_config
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -158,64 +329,79 @@ async def options_ui_config():
     return {"Allow": "POST, OPTIONS"}
 
 @app.get("/adaptations")
-async def get_adaptations():
+async def get_adaptations(user_id: str = Depends(current_user_id)):
     """Get current adaptation suggestions."""
     try:
-        agent = get_agent_manager()
+        agent = await get_agent_manager(user_id)
         return agent.get_adaptation_suggestions()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/full-context")
-async def get_full_context():
+async def get_full_context(user_id: str = Depends(current_user_id)):
     """Get complete context including personality, adaptations, and UI config."""
     try:
-        agent = get_agent_manager()
+        agent = await get_agent_manager(user_id)
         return agent.get_full_context()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache-stats")
+async def get_cache_stats(user_id: str = Depends(current_user_id)):
+    """Get hit/miss counters for the agent caches."""
+    try:
+        agent = await get_agent_manager(user_id)
+        return agent.get_cache_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/task-gate-stats")
+async def get_task_gate_stats(user_id: str = Depends(current_user_id)):
+    """Get how many chat messages skipped the task LLM."""
+    try:
+        agent = await get_agent_manager(user_id)
+        return agent.get_task_gate_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # WebSocket endpoint for real-time communication
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    user_id = websocket.query_params.get("user_id", DEFAULT_USER_ID)
     try:
         while True:
             data = await websocket.receive_text()
             message_data = json.loads(data)
             
             if message_data.get("type") == "chat":
-                agent = get_agent_manager()
+                agent = await get_agent_manager(user_id)
                 
                 # Process message
                 user_message = message_data.get("message", "")
                 context = message_data.get("context", "")
                 
-                # Generate response
-                response = agent.ask(user_message, context)
+                if message_data.get("stream"):
+                    # Forward token deltas as they arrive, then the side results
+                    async for frame in agent.astream_chat_pipeline(user_message, context):
+                        if frame["type"] == "tasks":
+                            await persist_extracted_tasks(frame["tasks"], user_id)
+                        await manager.send_personal_message(json.dumps(frame), websocket)
+                    continue
                 
-                # Get additional data
-                tasks = agent.extract_tasks(user_message)
-                personality_profile = agent.get_personality_profile()
-                ui_config = agent.get_ui_config(context)
-                adaptations = agent.get_adaptation_suggestions()
+                # Run response, task extraction and UI generation as one pipeline
+                result = await agent.achat_pipeline(user_message, context)
+                await persist_extracted_tasks(result["tasks"], user_id)
                 
                 # Send response
-                response_data = {
-                    "type": "chat_response",
-                    "response": response,
-                    "personality_profile": personality_profile,
-                    "tasks": tasks,
-                    "ui_config": ui_config,
-                    "adaptations": adaptations
-                }
+                response_data = {"type": "chat_response", **result}
                 
                 await manager.send_personal_message(json.dumps(response_data), websocket)
             
             elif message_data.get("type") == "ui_update":
-                agent = get_agent_manager()
+                agent = await get_agent_manager(user_id)
                 context = message_data.get("context", "")
-                ui_config = agent.get_ui_config(context)
+                ui_config = await agent.aget_ui_config(context)
                 
                 response_data = {
                     "type": "ui_config",
@@ -227,6 +413,11 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+@app.get("/pool-stats")
+async def get_pool_stats():
+    """Get occupancy of the per-user agent manager pool."""
+    return get_agent_pool().stats()
+
 # Health check
 @app.get("/health")
 async def health_check():
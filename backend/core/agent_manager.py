@@ -2,72 +2,372 @@ from agents.main_agent import create_main_agent
 from agents.task_agent import create_task_agent
 from agents.personality_agent import create_personality_agent
 from agents.ui_agent import create_ui_agent
+from agents.router import create_agent_model
+from core.executor import AgentExecutor
+from core.personality_updater import PersonalityUpdater
+from core.single_flight import SingleFlight
+from api.config import settings
+from services.task_extraction import ActionabilityGate
+from storage.loader import load_profile_store, load_task_cache
+from utils.cache import LRUCache, normalize_text, stable_hash
+from utils.context_index import BM25Index, chunk_text
+from utils.similarity_cache import SemanticCache
+from utils.token_budget import estimate_tokens
+import asyncio
 import json
+from concurrent.futures import Future
+
+
+def create_response_cache():
+    """The near-duplicate chat reply cache, or None unless CHAT_CACHE_ENABLED is set."""
+    if not settings.CHAT_CACHE_ENABLED:
+        return None
+    return SemanticCache(maxsize=settings.CHAT_CACHE_SIZE, threshold=settings.CHAT_CACHE_SIMILARITY)
+
 
 class AgentManager:
-    def __init__(self, provider, model, api_key):
+    def __init__(self, provider, model, api_key, executor=None, user_id=None, models=None, profile_store=None,
+                 task_cache=None, response_cache=None):
+        # `models` maps agent role -> prebuilt model instance so pooled managers
+        # can share model clients instead of building four new ones each;
+        # roles without one use their AGENT_MODELS tier, then the default model
+        models = dict(models or {})
+        for role, config in settings.AGENT_MODELS.items():
+            if role not in models:
+                models[role] = create_agent_model(config)
+        self.user_id = user_id
+        
+        # A manager that opens its own profile store is responsible for closing it
+        self.owns_profile_store = profile_store is None
+        self.profile_store = profile_store or load_profile_store()
+        self.owns_task_cache = task_cache is None
+        self.task_cache = task_cache or load_task_cache()
+        # Pooled managers share one reply cache; a standalone one builds its own
+        if response_cache is None:
+            response_cache = create_response_cache()
+        
         # Initialize all agents
-        self.personality_agent = create_personality_agent(provider, model, api_key)
-        self.task_agent = create_task_agent(provider, model, api_key)
-        self.main_agent = create_main_agent(provider, model, api_key, self.personality_agent, self.task_agent)
-        self.ui_agent = create_ui_agent(provider, model, api_key)
+        self.personality_agent = create_personality_agent(
+            provider, model, api_key, **self._agent_options("personality", models, user_id),
+            profile_store=self.profile_store
+        )
+        self.task_agent = create_task_agent(
+            provider, model, api_key, **self._agent_options("task", models, user_id),
+            cache=self.task_cache
+        )
+        self.main_agent = create_main_agent(
+            provider, model, api_key, self.personality_agent, self.task_agent,
+            **self._agent_options("chat", models, user_id),
+            response_cache=response_cache
+        )
+        self.ui_agent = create_ui_agent(
+            provider, model, api_key, **self._agent_options("ui", models, user_id),
+            llm_mode=settings.UI_CONFIG_LLM_MODE,
+            cache_size=settings.UI_CACHE_SIZE,
+            cache_ttl=settings.UI_CACHE_TTL_SECONDS
+        )
+        
+        # Cached UI configs are stale once the profile's ui_preferences move
+        self.personality_agent.on_ui_preferences_change(self.ui_agent.invalidate_cache)
         
         # Current personality profile and adaptations
         self.current_personality_profile = {}
         self.current_adaptations = {}
         self.current_ui_config = {}
+        
+        # Chit-chat ("thanks", "what's the weather") skips the task LLM in chat turns
+        self.task_gate = ActionabilityGate(settings.TASK_GATE_THRESHOLD)
+        
+        # Retrieval indexes for large contexts (e.g. a PDF), keyed by content hash
+        self.context_indexes = LRUCache(maxsize=4)
+        
+        # Bounded pool that runs the blocking agent calls off the event loop
+        self.executor = executor or AgentExecutor(settings.AGENT_MAX_CONCURRENCY)
+        
+        # Identical task / UI config requests in flight at once (several tabs,
+        # reconnects) share one LLM call
+        self.single_flight = SingleFlight()
+        
+        # In "background" mode replies use the last known adaptations and the
+        # personality analysis runs afterwards as one coalesced call
+        self.background_personality = settings.PERSONALITY_UPDATE_MODE == "background"
+        self.personality_updater = PersonalityUpdater(
+            self.personality_agent,
+            self.executor,
+            on_update=self._apply_personality,
+            debounce_seconds=settings.PERSONALITY_DEBOUNCE_SECONDS
+        )
 
-    def ask(self, prompt, context=""):
-        """Generate a personality-adapted response."""
-        # Update personality profile based on this interaction
-        personality_data = self.personality_agent.analyze_and_update(prompt)
+    @staticmethod
+    def _agent_options(role, models, user_id):
+        """Constructor options shared by every agent: model, user and prompt budget."""
+        options = {"model": models.get(role), "user_id": user_id}
+        if role in settings.AGENT_HISTORY_TURNS:
+            options["history_turns"] = settings.AGENT_HISTORY_TURNS[role]
+        if role in settings.AGENT_PROMPT_TOKEN_BUDGETS:
+            options["max_prompt_tokens"] = settings.AGENT_PROMPT_TOKEN_BUDGETS[role]
+        return options
+
+    def _apply_personality(self, personality_data):
+        """Push a personality profile and its adaptations to all agents."""
         self.current_personality_profile = personality_data
         
-        # Get adaptation suggestions
-        adaptations = self.personality_agent.get_adaptation_suggestions()
-        self.current_adaptations = adaptations
+        # Get adaptation suggestions. Cached extractions are keyed by the task
+        # adaptations, so new ones simply miss; old entries stay valid for the
+        # other users of the shared cache and age out by TTL/LRU
+        self.current_adaptations = self.personality_agent.get_adaptation_suggestions()
         
         # Update agents with personality context
         self.main_agent.update_personality_context(personality_data)
         self.task_agent.update_personality_context(personality_data)
         self.ui_agent.update_personality_context(personality_data)
+
+    def _refresh_personality(self, prompt):
+        """Bring the profile and adaptations up to date before replying."""
+        if self.background_personality:
+            # Reuse the last known adaptations; only seed them from the stored profile once
+            if not self.current_adaptations:
+                self._apply_personality(self.personality_agent.get_profile_json())
+            return self.current_personality_profile
         
-        # Generate adapted response
-        chat_adaptations = adaptations.get("chat_agent_adaptations", {})
+        personality_data = self.personality_agent.analyze_and_update(prompt)
+        self._apply_personality(personality_data)
+        return personality_data
+
+    def index_context(self, context):
+        """Return (building on first use) the retrieval index for a large context."""
+        key = stable_hash(context)
+        index = self.context_indexes.get(key)
+        if index is None:
+            index = BM25Index(chunk_text(context, chunk_words=settings.CONTEXT_CHUNK_WORDS))
+            self.context_indexes.set(key, index)
+        return index
+
+    def _select_context(self, prompt, context):
+        """Send small contexts as-is and only the top-k relevant chunks of large ones."""
+        if not context or estimate_tokens(context) <= settings.CONTEXT_RETRIEVAL_THRESHOLD_TOKENS:
+            return context
+        return self.index_context(context).build_context(prompt, settings.CONTEXT_TOP_K)
+
+    def _respond(self, prompt, context=""):
+        """Generate the adapted reply and feed it back into the personality profile."""
+        chat_adaptations = self.current_adaptations.get("chat_agent_adaptations", {})
+        context = self._select_context(prompt, context)
         response = self.main_agent.generate_response(prompt, context, chat_adaptations)
+        self._record_response(prompt, response)
+        return response
+
+    def _stream_response(self, prompt, context=""):
+        """Yield reply deltas; runs on the executor, so context retrieval happens off the loop."""
+        chat_adaptations = self.current_adaptations.get("chat_agent_adaptations", {})
+        context = self._select_context(prompt, context)
+        yield from self.main_agent.stream_response(prompt, context, chat_adaptations)
+
+    def _record_response(self, prompt, response):
+        """Update personality profile with the assistant's response."""
+        if self.background_personality:
+            self.personality_updater.submit(prompt, response)
+        else:
+            self.personality_agent.analyze_and_update(prompt, response)
+
+    def ask(self, prompt, context=""):
+        """Generate a personality-adapted response."""
+        self._refresh_personality(prompt)
+        return self._respond(prompt, context)
+
+    def chat_pipeline(self, prompt, context=""):
+        """Run a full chat turn, overlapping the stages that don't depend on each other.
         
-        # Update personality profile with the assistant's response
-        self.personality_agent.analyze_and_update(prompt, response)
+        Task extraction only needs the raw message, so it starts right away
+        (and is skipped outright for messages the actionability gate rejects).
+        The UI config starts as soon as fresh adaptations exist and runs
+        alongside the chat response; it is built from the adaptations only,
+        since chat and document context must not trigger custom-layout LLM
+        calls (that is reserved for explicit `/ui-config` requests). Wall-clock time is roughly the
+        critical path: personality analysis -> response -> follow-up analysis,
+        or just the response when personality updates run in the background.
+        """
+        # Single-flight followers chain onto the leader's future instead of
+        # blocking a pool thread, which could deadlock a saturated pool
+        tasks_future = self.submit_chat_tasks(prompt)
         
-        return response
+        self._refresh_personality(prompt)
+        ui_future = self._submit_flight(self._ui_config_flight(""))
+        
+        response = self._respond(prompt, context)
+        
+        return {
+            "response": response,
+            "personality_profile": self.get_personality_profile(),
+            "tasks": tasks_future.result(),
+            "ui_config": ui_future.result(),
+            "adaptations": self.get_adaptation_suggestions()
+        }
+
+    async def achat_pipeline(self, prompt, context=""):
+        """Async variant of `chat_pipeline` that never blocks the event loop."""
+        tasks_job = asyncio.ensure_future(self.aextract_chat_tasks(prompt))
+        
+        await self.executor.run(self._refresh_personality, prompt)
+        ui_job = asyncio.ensure_future(self.aget_ui_config(""))
+        
+        response = await self.executor.run(self._respond, prompt, context)
+        tasks, ui_config = await asyncio.gather(tasks_job, ui_job)
+        
+        return {
+            "response": response,
+            "personality_profile": self.get_personality_profile(),
+            "tasks": tasks,
+            "ui_config": ui_config,
+            "adaptations": self.get_adaptation_suggestions()
+        }
+
+    async def astream_chat_pipeline(self, prompt, context=""):
+        """Streaming variant of `achat_pipeline` yielding event dicts.
+        
+        Emits `chat_delta` frames while the reply is generated, a `chat_done`
+        frame with the full reply, then `tasks`, `ui_config` and
+        `personality_profile` frames in whatever order they finish.
+        """
+        tasks_job = asyncio.ensure_future(self.aextract_chat_tasks(prompt))
+        
+        await self.executor.run(self._refresh_personality, prompt)
+        ui_job = asyncio.ensure_future(self.aget_ui_config(""))
+        
+        deltas = []
+        async for delta in self.executor.stream(self._stream_response, prompt, context):
+            deltas.append(delta)
+            yield {"type": "chat_delta", "delta": delta}
+        response = "".join(deltas)
+        yield {"type": "chat_done", "response": response}
+        
+        async def tasks_frame():
+            return {"type": "tasks", "tasks": await tasks_job}
+        
+        async def ui_frame():
+            return {"type": "ui_config", "ui_config": await ui_job}
+        
+        async def personality_frame():
+            await self.executor.run(self._record_response, prompt, response)
+            return {
+                "type": "personality_profile",
+                "personality_profile": self.get_personality_profile(),
+                "adaptations": self.get_adaptation_suggestions()
+            }
+        
+        for frame in asyncio.as_completed([tasks_frame(), ui_frame(), personality_frame()]):
+            yield await frame
+
+    async def aask(self, prompt, context=""):
+        """Async variant of `ask`."""
+        return await self.executor.run(self.ask, prompt, context)
+
+    def _tasks_flight(self, prompt):
+        """Single-flight key and call for extracting tasks under the current adaptations."""
+        task_adaptations = self.current_adaptations.get("task_agent_adaptations", {})
+        key = ("tasks", normalize_text(prompt), stable_hash(task_adaptations))
+        return key, self.task_agent.extract_tasks, prompt, task_adaptations
 
     def extract_tasks(self, prompt):
         """Extract tasks with personality adaptations."""
-        task_adaptations = self.current_adaptations.get("task_agent_adaptations", {})
-        return self.task_agent.extract_tasks(prompt, task_adaptations)
+        return self.single_flight.do(*self._tasks_flight(prompt))
+
+    def _submit_flight(self, flight):
+        """Start a single-flight call on the executor and return its Future."""
+        key, fn, *args = flight
+        return self.single_flight.submit(key, self.executor.submit, fn, *args)
+
+    @staticmethod
+    def _no_chat_tasks():
+        return {"tasks": [], "summary": "No actionable tasks detected", "recommendations": ""}
+
+    def extract_chat_tasks(self, prompt):
+        """Extract tasks from a chat message, unless it is clearly not actionable."""
+        if not self.task_gate.allows(prompt):
+            return self._no_chat_tasks()
+        return self.extract_tasks(prompt)
+
+    def submit_chat_tasks(self, prompt):
+        """Non-blocking `extract_chat_tasks`: a Future, started on the executor if the gate allows."""
+        if not self.task_gate.allows(prompt):
+            future = Future()
+            future.set_result(self._no_chat_tasks())
+            return future
+        return self._submit_flight(self._tasks_flight(prompt))
+
+    async def aextract_tasks(self, prompt):
+        """Async variant of `extract_tasks`."""
+        key, fn, *args = self._tasks_flight(prompt)
+        return await self.single_flight.ado(key, self.executor.run, fn, *args)
+
+    async def aextract_chat_tasks(self, prompt):
+        """Async variant of `extract_chat_tasks`; the (cheap, local) gate runs on the loop."""
+        if not self.task_gate.allows(prompt):
+            return self._no_chat_tasks()
+        return await self.aextract_tasks(prompt)
 
     def analyze_personality(self, user_input, assistant_response=""):
         """Analyze and update personality profile."""
         return self.personality_agent.analyze_and_update(user_input, assistant_response)
     
+    async def aanalyze_personality(self, user_input, assistant_response=""):
+        """Async variant of `analyze_personality`."""
+        return await self.executor.run(self.analyze_personality, user_input, assistant_response)
+    
     def get_personality_profile(self):
         """Get current personality profile."""
         return self.current_personality_profile
     
-    def get_ui_config(self, context=""):
-        """Generate UI configuration based on current personality profile."""
+    def _ui_config_flight(self, context):
+        """Single-flight key and call for a UI config under the current adaptations."""
         ui_adaptations = self.current_adaptations.get("ui_adaptations", {})
+        key = ("ui_config", stable_hash(context), stable_hash(ui_adaptations))
+        return key, self._generate_ui_config, context, ui_adaptations
+
+    def _generate_ui_config(self, context, ui_adaptations):
         ui_config = self.ui_agent.generate_ui_config(context, ui_adaptations)
         self.current_ui_config = ui_config
         return ui_config
+
+    def get_ui_config(self, context=""):
+        """Generate UI configuration based on current personality profile."""
+        return self.single_flight.do(*self._ui_config_flight(context))
+    
+    async def aget_ui_config(self, context=""):
+        """Async variant of `get_ui_config`."""
+        key, fn, *args = self._ui_config_flight(context)
+        return await self.single_flight.ado(key, self.executor.run, fn, *args)
     
     def get_adaptation_suggestions(self):
         """Get current adaptation suggestions for all agents."""
         return self.current_adaptations
     
+    def get_cache_stats(self):
+        """Get hit/miss counters for the agent-level caches."""
+        return {
+            "ui_config": self.ui_agent.get_cache_stats(),
+            "task_extraction": self.task_agent.get_cache_stats(),
+            "chat_response": self.main_agent.get_cache_stats(),
+            "single_flight": self.single_flight.stats()
+        }
+    
+    def get_task_gate_stats(self):
+        """Get skip rate and classifier timing of the actionability gate."""
+        return self.task_gate.stats()
+    
+    def close(self):
+        """Persist per-user state before this manager is dropped."""
+        self.personality_updater.flush()
+        self.personality_agent.save_profile()
+        if self.owns_profile_store:
+            self.profile_store.close()
+        if self.owns_task_cache:
+            self.task_cache.close()
+    
     def get_full_context(self):
         """Get complete context including personality, adaptations, and UI config."""
         return {
+            "user_id": self.user_id,
             "personality_profile": self.current_personality_profile,
             "adaptations": self.current_adaptations,
             "ui_config": self.current_ui_config,
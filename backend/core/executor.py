@@ -0,0 +1,55 @@
+# core/executor.py
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AgentExecutor:
+    """Bounded thread pool for running blocking agno `Agent.run` calls.
+
+    Sync callers get a concurrent Future from `submit`; async callers
+    `await run(...)` so the event loop keeps serving other requests while
+    the model call is in flight. `max_concurrency` caps how many agent
+    calls run at once; extra work waits in the pool's queue.
+    """
+
+    def __init__(self, max_concurrency=8):
+        self.max_concurrency = max_concurrency
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="agent-exec")
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule a blocking call and return a concurrent.futures.Future."""
+        return self.pool.submit(fn, *args, **kwargs)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call on the pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(fn, *args, **kwargs))
+
+    async def stream(self, gen_fn, *args, **kwargs):
+        """Drive a blocking generator on the pool and yield its items asynchronously."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        done = object()
+
+        def produce():
+            try:
+                for item in gen_fn(*args, **kwargs):
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        producer = loop.run_in_executor(self.pool, produce)
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await producer
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
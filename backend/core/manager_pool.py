@@ -0,0 +1,154 @@
+# core/manager_pool.py
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from agents.base import create_model_instance, model_rate_limit_stats
+from agents.router import RouteHealth, create_agent_model, create_routed_model
+from core.agent_manager import AgentManager, create_response_cache
+from storage.loader import load_profile_store, load_task_cache
+
+# Agent roles inside an AgentManager; each gets one model instance shared by all users
+AGENT_ROLES = ("personality", "task", "chat", "ui")
+
+
+class AgentManagerPool:
+    """Bounded pool of per-user AgentManager instances.
+
+    Managers are built lazily on first use and kept in LRU order. When the
+    pool is full the least recently used manager is closed (persisting its
+    profile) and dropped. Model client objects, the profile store, the
+    task extraction cache and the chat reply cache (bucketed per user) are
+    built once and shared by every manager in the pool.
+
+    Building a manager (agents, session storage, profile load) happens
+    outside the pool lock, so other users aren't held up; concurrent
+    requests for the same new user wait for the one build in progress.
+    """
+
+    def __init__(self, provider, model, api_key, executor=None, max_size=64, routes=None, route_window=50,
+                 router_options=None, agent_models=None):
+        self.provider = provider
+        self.model = model
+        self.api_key = api_key
+        self.executor = executor
+        self.max_size = max_size
+
+        # Every routed model shares one health window, so all roles learn from each call
+        router_options = router_options or {}
+        agent_models = agent_models or {}
+        self.route_health = RouteHealth(window=route_window)
+        self.models = {}
+        for role in AGENT_ROLES:
+            if role in agent_models:
+                self.models[role] = create_agent_model(agent_models[role], health=self.route_health, **router_options)
+            elif routes:
+                self.models[role] = create_routed_model(routes, health=self.route_health, **router_options)
+            else:
+                self.models[role] = create_model_instance(provider, model, api_key)
+        self.profile_store = load_profile_store()
+        self.task_cache = load_task_cache()
+        self.response_cache = create_response_cache()
+        self.managers = OrderedDict()
+        # user_id -> Future of the manager being built for that user
+        self.building = {}
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def _lookup(self, user_id):
+        """Call under the lock: returns (manager, build future, is_builder).
+
+        A pooled manager comes back directly; otherwise the caller either
+        waits on the build in progress or becomes its builder.
+        """
+        manager = self.managers.get(user_id)
+        if manager is not None:
+            self.managers.move_to_end(user_id)
+            return manager, None, False
+        building = self.building.get(user_id)
+        if building is not None:
+            return None, building, False
+        building = self.building[user_id] = Future()
+        return None, building, True
+
+    def get(self, user_id):
+        """Return the manager for `user_id`, building it if needed (blocking; see `aget`)."""
+        with self.lock:
+            manager, building, builder = self._lookup(user_id)
+        if manager is not None:
+            return manager
+        if not builder:
+            return building.result()
+
+        try:
+            manager = AgentManager(
+                self.provider, self.model, self.api_key,
+                executor=self.executor, user_id=user_id, models=self.models,
+                profile_store=self.profile_store, task_cache=self.task_cache,
+                response_cache=self.response_cache
+            )
+        except BaseException as e:
+            with self.lock:
+                self.building.pop(user_id, None)
+            building.set_exception(e)
+            raise
+
+        evicted = []
+        with self.lock:
+            self.building.pop(user_id, None)
+            self.managers[user_id] = manager
+            while len(self.managers) > self.max_size:
+                _, idle_manager = self.managers.popitem(last=False)
+                evicted.append(idle_manager)
+                self.evictions += 1
+        building.set_result(manager)
+
+        # Persist evicted state outside the lock (and off the caller's thread
+        # when possible) so other users aren't held up
+        for idle_manager in evicted:
+            if self.executor is not None:
+                self.executor.submit(self._close, idle_manager)
+            else:
+                self._close(idle_manager)
+        return manager
+
+    async def aget(self, user_id):
+        """Async variant of `get`: pooled managers return at once, new ones are built on the executor."""
+        with self.lock:
+            manager = self.managers.get(user_id)
+            if manager is not None:
+                self.managers.move_to_end(user_id)
+                return manager
+            building = self.building.get(user_id)
+        if building is not None:
+            return await asyncio.wrap_future(building)
+        if self.executor is None:
+            return await asyncio.to_thread(self.get, user_id)
+        return await self.executor.run(self.get, user_id)
+
+    def _close(self, manager):
+        try:
+            manager.close()
+        except Exception as e:
+            print(f"Warning: Could not persist state for user {manager.user_id}: {e}")
+
+    def close_all(self):
+        """Persist and drop every pooled manager (used on shutdown)."""
+        with self.lock:
+            managers = list(self.managers.values())
+            self.managers.clear()
+        for manager in managers:
+            self._close(manager)
+        self.profile_store.close()
+        self.task_cache.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.managers),
+                "max_size": self.max_size,
+                "evictions": self.evictions,
+                "building": len(self.building),
+                "routes": self.route_health.stats(),
+                "rate_limits": model_rate_limit_stats()
+            }
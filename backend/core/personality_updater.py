@@ -0,0 +1,69 @@
+# core/personality_updater.py
+import threading
+
+
+class PersonalityUpdater:
+    """Runs personality analysis in the background, off the response path.
+
+    Interactions submitted while an update is pending or running are
+    coalesced: after a short debounce window everything queued so far is
+    sent to the personality agent as a single analysis call.
+    """
+
+    def __init__(self, personality_agent, executor, on_update, debounce_seconds=2.0):
+        self.personality_agent = personality_agent
+        self.executor = executor
+        self.on_update = on_update
+        self.debounce_seconds = debounce_seconds
+
+        self.lock = threading.Lock()
+        self.pending = []
+        self.scheduled = False
+        self.timer = None
+
+    def submit(self, user_input, assistant_response=""):
+        """Queue an interaction for the next background analysis."""
+        with self.lock:
+            self.pending.append((user_input, assistant_response))
+            if self.scheduled:
+                return
+            self.scheduled = True
+            self._schedule()
+
+    def _schedule(self):
+        # Wait out the debounce window on a timer so no pool worker sits idle
+        self.timer = threading.Timer(self.debounce_seconds, self.executor.submit, args=(self._drain,))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _take_batch(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            return batch
+
+    def _run_batch(self, batch):
+        try:
+            profile = self.personality_agent.analyze_interactions(batch)
+            self.on_update(profile)
+        except Exception as e:
+            print(f"Error in background personality update: {e}")
+
+    def _drain(self):
+        self._run_batch(self._take_batch())
+
+        # Anything that arrived during the analysis goes into one more round
+        with self.lock:
+            if self.pending:
+                self._schedule()
+            else:
+                self.scheduled = False
+
+    def flush(self):
+        """Synchronously analyze anything still queued (used on shutdown)."""
+        if self.timer:
+            self.timer.cancel()
+        batch = self._take_batch()
+        if batch:
+            self._run_batch(batch)
+        with self.lock:
+            self.scheduled = False
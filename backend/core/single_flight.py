@@ -0,0 +1,99 @@
+# core/single_flight.py
+import asyncio
+import copy
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one computation.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is still running wait for the same result instead of
+    starting their own. The leader publishes a deep-copied snapshot before
+    returning its own result, and each follower gets a deep copy of that
+    snapshot, so one caller mutating its result (e.g. adding stored task
+    ids) can't affect another. Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self.calls[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def _lead(self, key, future, fn, args):
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            with self.lock:
+                self.calls.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self.lock:
+            self.calls.pop(key, None)
+        # Snapshot before returning: the leader's caller may mutate `result` right away
+        future.set_result(copy.deepcopy(result))
+        return result
+
+    def do(self, key, fn, *args):
+        """Run `fn(*args)`, or wait for the identical call already in flight.
+
+        Blocks the calling thread, so never call it from a job on a pool
+        whose queue may hold the leader (use `submit` or `ado` there).
+        """
+        future, leader = self._join(key)
+        if leader:
+            return self._lead(key, future, fn, args)
+        return copy.deepcopy(future.result())
+
+    def submit(self, key, submit, fn, *args):
+        """Non-blocking variant of `do` returning a concurrent Future.
+
+        The leader's call is handed to `submit` (e.g. AgentExecutor.submit);
+        followers get a future completed from the leader's, so no pool
+        thread ever waits on another job queued in the same pool.
+        """
+        future, leader = self._join(key)
+        if leader:
+            return submit(self._lead, key, future, fn, args)
+        copied = Future()
+
+        def relay(done):
+            try:
+                copied.set_result(copy.deepcopy(done.result()))
+            except BaseException as e:
+                copied.set_exception(e)
+        future.add_done_callback(relay)
+        return copied
+
+    async def ado(self, key, run, fn, *args):
+        """Async variant of `do`; the leader runs `fn` through `run` (e.g. AgentExecutor.run).
+
+        Followers await the leader's future directly, so they don't hold an
+        executor thread while they wait.
+        """
+        future, leader = self._join(key)
+        if leader:
+            return await run(self._lead, key, future, fn, args)
+        return copy.deepcopy(await asyncio.wrap_future(future))
+
+    def stats(self):
+        with self.lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "in_flight": len(self.calls),
+                "executed": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": self.coalesced / calls if calls else 0.0
+            }
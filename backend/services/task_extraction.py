@@ -1,3 +1,8 @@
+import re
+import threading
+import time
+
+
 def parse_tasks_from_response(response_text):
     tasks = []
     for line in response_text.split('\n'):
@@ -7,3 +12,111 @@ def parse_tasks_from_response(response_text):
             if len(task) > 3:
                 tasks.append(task)
     return tasks
+
+
+# Local actionability scoring, used to skip the task LLM for chit-chat
+IMPERATIVE_VERBS = frozenset("""
+add answer arrange ask attend book buy call cancel check clean complete confirm contact create deliver
+draft email file finish fix follow get organize order pay pick plan post prepare print read register
+remind renew reply reschedule research review schedule send set share sign study submit text update
+upload visit write
+""".split())
+LEAD_IN = re.compile(
+    r"^(?:(?:[-*•]|\d+[.)])\s*)?(?:(?:please|pls|ok|okay|also|and|then|so)\s+)*"
+    r"(?:(?:can|could|would|will) you\s+|let'?s\s+|don'?t forget to\s+|remember to\s+)?(\w+)"
+)
+OBLIGATION = re.compile(
+    r"\b(?:need(?:s)? to|have to|has to|got to|gotta|must|should|remind me|remember to|don'?t forget|"
+    r"to-?do|deadline|due|task|action items?|follow[ -]up)\b"
+)
+TEMPORAL = re.compile(
+    r"\b(?:today|tonight|tomorrow|tmrw|eod|eow|asap|"
+    r"(?:this|next) (?:morning|afternoon|evening|week|month|year|monday|tuesday|wednesday|thursday|friday|saturday|sunday)|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+    r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|jun(?:e)?|jul(?:y)?|aug(?:ust)?|sep(?:tember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?|"
+    r"in \d+ (?:minutes?|hours?|days?|weeks?)|"
+    r"at \d{1,2}(?::\d{2})?\s*(?:am|pm)?|\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?)\b"
+)
+LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)]|\[ ?\])\s+\S", re.MULTILINE)
+SENTENCE_SPLIT = re.compile(r"[.!?\n;]+")
+
+# Each positive signal alone reaches the default threshold (0.4): a dated
+# note like "Dentist appointment March 3" is a task even with no verb
+ACTIONABILITY_WEIGHTS = {
+    "imperative": 0.5,
+    "obligation": 0.4,
+    "temporal": 0.4,
+    "list": 0.4,
+    "question": -0.15
+}
+
+
+def actionability_score(text):
+    """Score in [0, 1] of how likely `text` contains a task, without calling a model.
+
+    Looks for sentences led by an imperative verb, obligation phrases
+    ("need to", "remind me"), date/time phrases and list markers. A plain
+    question with no imperative or obligation is pushed down.
+    """
+    lowered = (text or "").lower()
+    if not lowered.strip():
+        return 0.0
+
+    imperative = False
+    for sentence in SENTENCE_SPLIT.split(lowered):
+        match = LEAD_IN.match(sentence.strip())
+        if match and match.group(1) in IMPERATIVE_VERBS:
+            imperative = True
+            break
+    obligation = OBLIGATION.search(lowered) is not None
+    temporal = TEMPORAL.search(lowered) is not None
+    list_items = len(LIST_MARKER.findall(lowered))
+
+    score = 0.0
+    if imperative:
+        score += ACTIONABILITY_WEIGHTS["imperative"]
+    if obligation:
+        score += ACTIONABILITY_WEIGHTS["obligation"]
+    if temporal:
+        score += ACTIONABILITY_WEIGHTS["temporal"]
+    if list_items >= 2:
+        score += ACTIONABILITY_WEIGHTS["list"]
+    if lowered.rstrip().endswith("?") and not (imperative or obligation):
+        score += ACTIONABILITY_WEIGHTS["question"]
+    return min(max(score, 0.0), 1.0)
+
+
+class ActionabilityGate:
+    """Decides whether a message is worth a task-extraction LLM call.
+
+    Keeps counters of checked and skipped messages and the time spent
+    classifying, so the threshold can be tuned from real traffic.
+    """
+
+    def __init__(self, threshold=0.4):
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.checked = 0
+        self.skipped = 0
+        self.seconds = 0.0
+
+    def allows(self, text):
+        start = time.perf_counter()
+        score = actionability_score(text)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.checked += 1
+            self.seconds += elapsed
+            if score < self.threshold:
+                self.skipped += 1
+        return score >= self.threshold
+
+    def stats(self):
+        with self.lock:
+            return {
+                "threshold": self.threshold,
+                "checked": self.checked,
+                "skipped": self.skipped,
+                "skip_rate": self.skipped / self.checked if self.checked else 0.0,
+                "avg_classify_ms": 1000 * self.seconds / self.checked if self.checked else 0.0
+            }
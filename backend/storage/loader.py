@@ -1,16 +1,36 @@
 from agno.storage.agent.sqlite import SqliteAgentStorage
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import text
+from sqlalchemy import event, text
 from api.config import settings
+from storage.profile_store import ProfileStore
+from storage.sqlite_cache import SQLiteCache
+from utils.cache import LRUCache, TieredCache
 import os
 
 Base = declarative_base()
-engine = create_async_engine(settings.DATABASE_URL, pool_size=5, max_overflow=10)
+engine = create_async_engine(settings.DATABASE_URL, pool_size=5, max_overflow=10, pool_pre_ping=True)
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, _connection_record):
+        # Applied once per pooled connection, not per query
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA cache_size=-16000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
 async def init_db():
+    # Import models so their tables are registered on Base before create_all
+    import storage.task_db
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(storage.task_db.migrate_tasks_table)
 
 def load_session_storage():
     storage_path = os.getenv("AGENT_STORAGE_PATH", "business_agent.db")
@@ -23,3 +43,17 @@ def load_personality_storage():
 def load_task_storage():
     storage_path = os.getenv("TASK_STORAGE_PATH", "task_data.db")
     return SqliteAgentStorage(table_name="task_sessions", db_file=storage_path)
+
+def load_profile_store():
+    storage_path = os.getenv("PROFILE_STORAGE_PATH", "personality_profiles.db")
+    flush_interval = float(os.getenv("PROFILE_FLUSH_INTERVAL", "5"))
+    return ProfileStore(storage_path, flush_interval=flush_interval)
+
+def load_task_cache():
+    storage_path = os.getenv("TASK_CACHE_PATH", "task_cache.db")
+    memory = LRUCache(maxsize=settings.TASK_CACHE_SIZE, ttl=settings.TASK_CACHE_TTL_SECONDS)
+    disk = SQLiteCache(
+        storage_path, table="task_extractions",
+        maxsize=settings.TASK_CACHE_DISK_SIZE, ttl=settings.TASK_CACHE_TTL_SECONDS
+    )
+    return TieredCache(memory, disk)
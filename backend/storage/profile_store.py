@@ -0,0 +1,85 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class ProfileStore:
+    """Personality profiles in SQLite (WAL mode), keyed by user id.
+
+    Writes are write-behind: `save` only updates an in-memory dirty set,
+    and a background thread commits all dirty profiles in one transaction
+    every `flush_interval` seconds. `close` flushes whatever is left, so
+    call it on shutdown.
+    """
+
+    def __init__(self, db_path, flush_interval=5.0):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS personality_profiles (
+                user_id TEXT PRIMARY KEY,
+                profile TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+        self.lock = threading.Lock()
+        self.dirty = {}
+        self.stop_event = threading.Event()
+        self.flusher = threading.Thread(target=self._flush_loop, name="profile-store-flush", daemon=True)
+        self.flusher.start()
+
+    def load(self, user_id):
+        """Return the stored profile dict for `user_id`, or None."""
+        with self.lock:
+            if user_id in self.dirty:
+                return json.loads(self.dirty[user_id][0])
+            row = self.conn.execute(
+                "SELECT profile FROM personality_profiles WHERE user_id=?", (user_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, user_id, profile):
+        """Mark a profile dirty; it is committed on the next flush."""
+        payload = json.dumps(profile)
+        with self.lock:
+            self.dirty[user_id] = (payload, time.time())
+
+    def flush(self):
+        """Commit all dirty profiles in a single transaction."""
+        with self.lock:
+            if not self.dirty:
+                return 0
+            rows = [(user_id, payload, updated_at) for user_id, (payload, updated_at) in self.dirty.items()]
+            try:
+                with self.conn:
+                    self.conn.executemany("""
+                        INSERT INTO personality_profiles (user_id, profile, updated_at) VALUES (?, ?, ?)
+                        ON CONFLICT(user_id) DO UPDATE SET profile=excluded.profile, updated_at=excluded.updated_at
+                    """, rows)
+            except sqlite3.Error as e:
+                print(f"Warning: Could not flush personality profiles: {e}")
+                return 0
+            self.dirty.clear()
+            return len(rows)
+
+    def _flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stop the background flusher, flush pending profiles and close the database."""
+        if self.stop_event.is_set():
+            return
+        self.stop_event.set()
+        self.flusher.join(timeout=self.flush_interval + 1)
+        self.flush()
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+
+
+class SQLiteCache:
+    """Size-bounded, TTL-aware key/value cache in a WAL-mode SQLite file.
+
+    Values are strings. Entries carry a `namespace` so a whole group can be
+    invalidated at once. When the table grows past `maxsize` the least
+    recently accessed entries are pruned.
+    """
+
+    # Prune at most every this many writes to keep `set` cheap
+    PRUNE_EVERY = 64
+
+    def __init__(self, db_path, table="cache", maxsize=10000, ttl=None):
+        self.table = table
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_namespace ON {table} (namespace)")
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_accessed ON {table} (accessed_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key=?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                if row is not None:
+                    self.conn.execute(f"DELETE FROM {self.table} WHERE key=?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute(f"UPDATE {self.table} SET accessed_at=? WHERE key=?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value, namespace=""):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self.lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, namespace, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, value, expires_at, now)
+            )
+            self.writes += 1
+            if self.writes % self.PRUNE_EVERY == 0:
+                self._prune(now)
+            self.conn.commit()
+
+    def _prune(self, now):
+        self.conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self.conn.execute(f"""
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.maxsize,))
+
+    def invalidate_namespace(self, namespace):
+        with self.lock:
+            self.conn.execute(f"DELETE FROM {self.table} WHERE namespace=?", (namespace,))
+            self.conn.commit()
+
+    def stats(self):
+        with self.lock:
+            size = self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "size": size,
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
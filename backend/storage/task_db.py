@@ -1,51 +1,327 @@
-import sqlite3
 from uuid import uuid4
-DB_PATH = "task_data.db"
-
-
-
-def get_all_tasks():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tasks")
-    rows = cursor.fetchall()
-    conn.close()
-
-    return [
-        {
-            "id": row[0],
-            "title": row[1],
-            "description": row[2],
-            "due_date": row[3],
-            "priority": row[4],
-            "status": row[5],
-            "project_id": row[6],
+import base64
+import hashlib
+import re
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import Column, Float, Index, String, Text, delete, inspect, insert, select, text, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from storage.loader import Base, async_session
+
+TASK_FIELDS = ("title", "description", "due_date", "priority", "status", "project_id")
+# Indexes from before listing was scoped per user; dropped by `migrate_tasks_table`
+OBSOLETE_INDEXES = (
+    "ix_tasks_created", "ix_tasks_status_created", "ix_tasks_priority_created",
+    "ix_tasks_project_created", "ix_tasks_due_date",
+)
+# Owner of rows stored before tasks were scoped per user (the API's default user)
+LEGACY_USER_ID = "default"
+
+
+class Task(Base):
+    __tablename__ = "tasks"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid4()))
+    user_id = Column(String, nullable=False, default=LEGACY_USER_ID)
+    title = Column(String, nullable=False)
+    description = Column(Text)
+    due_date = Column(String)  # ISO 8601 or NULL (see normalize_due_date), so string order is date order
+    priority = Column(String)
+    status = Column(String, default="pending")
+    project_id = Column(String)
+    created_at = Column(Float, nullable=False, default=time.time)
+    # Normalized hash of owner + title + project, so re-extracting a task
+    # updates the owner's row instead of duplicating it (or touching another user's)
+    content_hash = Column(String)
+
+    # Listing is per user and keyset-paginated on (created_at, id), or on
+    # (due_date, created_at, id) when a due range is given; each index leads
+    # with user_id and the filter column and ends with the sort key
+    __table_args__ = (
+        Index("ux_tasks_user_content_hash", "user_id", "content_hash", unique=True),
+        Index("ix_tasks_user_created", "user_id", "created_at", "id"),
+        Index("ix_tasks_user_status_created", "user_id", "status", "created_at", "id"),
+        Index("ix_tasks_user_priority_created", "user_id", "priority", "created_at", "id"),
+        Index("ix_tasks_user_project_created", "user_id", "project_id", "created_at", "id"),
+        Index("ix_tasks_user_due_created", "user_id", "due_date", "created_at", "id"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "title": self.title,
+            "description": self.description,
+            "due_date": self.due_date,
+            "priority": self.priority,
+            "status": self.status,
+            "project_id": self.project_id,
+            "created_at": self.created_at,
+            "content_hash": self.content_hash,
+        }
+
+
+def task_content_hash(user_id, title, project_id=None):
+    """Hash of the owner and normalized title (and project) used to deduplicate tasks."""
+    normalized = " ".join(re.sub(r"[^\w\s]", " ", (title or "").lower()).split())
+    return hashlib.sha1(f"{user_id}|{project_id or ''}|{normalized}".encode("utf-8")).hexdigest()
+
+
+def normalize_due_date(value):
+    """ISO 8601 form of a due date, or None if it isn't one (e.g. "tomorrow").
+
+    Dates stay `YYYY-MM-DD` and datetimes become `YYYY-MM-DDTHH:MM:SS`, so
+    stored values sort and range-filter correctly as strings.
+    """
+    if isinstance(value, date):  # datetime included
+        return value.isoformat()
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        if len(value) == 10:
+            return date.fromisoformat(value).isoformat()
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        return None
+
+
+def _task_row(task, user_id):
+    row = {field: task.get(field) for field in TASK_FIELDS}
+    row["due_date"] = normalize_due_date(row["due_date"])
+    row["id"] = task.get("id") or str(uuid4())
+    row["user_id"] = user_id
+    row["status"] = row["status"] or "pending"
+    row["created_at"] = time.time()
+    row["content_hash"] = task_content_hash(user_id, row["title"], row["project_id"])
+    return row
+
+
+def migrate_tasks_table(connection):
+    """Bring a tasks table created before per-user scoping up to date (run inside `init_db`).
+
+    Adds the `user_id` column, assigns existing rows to LEGACY_USER_ID,
+    rehashes them with their owner, normalizes free-text due dates and
+    swaps the old indexes for the per-user ones.
+    """
+    columns = {column["name"] for column in inspect(connection).get_columns(Task.__tablename__)}
+    if "user_id" not in columns:
+        connection.execute(text(f"ALTER TABLE tasks ADD COLUMN user_id VARCHAR NOT NULL DEFAULT '{LEGACY_USER_ID}'"))
+        rows = connection.execute(select(Task.id, Task.title, Task.project_id, Task.due_date)).all()
+        if rows:
+            connection.execute(update(Task), [
+                {
+                    "id": task_id,
+                    "content_hash": task_content_hash(LEGACY_USER_ID, title, project_id),
+                    "due_date": normalize_due_date(due_date),
+                }
+                for task_id, title, project_id, due_date in rows
+            ])
+    for name in OBSOLETE_INDEXES:
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    for index in Task.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def _sort_key(by_due_date):
+    if by_due_date:
+        return (Task.due_date, Task.created_at, Task.id)
+    return (Task.created_at, Task.id)
+
+
+def _encode_cursor(task, by_due_date):
+    parts = [repr(task.created_at), task.id]
+    if by_due_date:
+        parts.insert(0, task.due_date)
+    return base64.urlsafe_b64encode("|".join(parts).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor, by_due_date):
+    try:
+        parts = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 2 if by_due_date else 1)
+        if by_due_date:
+            due_date, created_at, task_id = parts
+            return due_date, float(created_at), task_id
+        created_at, task_id = parts
+        return float(created_at), task_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _due_bound(name, value):
+    normalized = normalize_due_date(value)
+    if normalized is None:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime: {value}")
+    return normalized
+
+
+def _filtered_query(user_id, status=None, priority=None, project_id=None, due_after=None, due_before=None):
+    query = select(Task).where(Task.user_id == user_id)
+    if status is not None:
+        query = query.where(Task.status == status)
+    if priority is not None:
+        query = query.where(Task.priority == priority)
+    if project_id is not None:
+        query = query.where(Task.project_id == project_id)
+    if due_after is not None:
+        query = query.where(Task.due_date >= _due_bound("due_after", due_after))
+    if due_before is not None:
+        due_before = _due_bound("due_before", due_before)
+        if len(due_before) == 10:
+            # A date bound includes the whole day, i.e. datetimes stored for it
+            query = query.where(Task.due_date < (date.fromisoformat(due_before) + timedelta(days=1)).isoformat())
+        else:
+            query = query.where(Task.due_date <= due_before)
+    return query
+
+
+async def get_all_tasks():
+    async with async_session() as session:
+        result = await session.execute(select(Task))
+        return [task.to_dict() for task in result.scalars()]
+
+
+async def list_tasks(user_id, limit=50, cursor=None, **filters):
+    """One page of `user_id`'s tasks, filtered on status/priority/project_id/due date.
+    
+    Tasks come in creation order, or in due date order when a due range is
+    given (so the range is served by the due date index). Pass the returned
+    `next_cursor` back to get the following page; cost depends on `limit`,
+    not on how many tasks precede the cursor.
+    """
+    by_due_date = filters.get("due_after") is not None or filters.get("due_before") is not None
+    sort_key = _sort_key(by_due_date)
+    query = _filtered_query(user_id, **filters)
+    if cursor:
+        query = query.where(tuple_(*sort_key) > _decode_cursor(cursor, by_due_date))
+    query = query.order_by(*sort_key).limit(limit + 1)
+    
+    async with async_session() as session:
+        result = await session.execute(query)
+        tasks = list(result.scalars())
+    
+    has_more = len(tasks) > limit
+    tasks = tasks[:limit]
+    return {
+        "tasks": [task.to_dict() for task in tasks],
+        "next_cursor": _encode_cursor(tasks[-1], by_due_date) if has_more else None
+    }
+
+
+async def iter_tasks(user_id, batch_size=500, **filters):
+    """Async generator over every matching task of `user_id`, fetched a keyset page at a time."""
+    cursor = None
+    while True:
+        page = await list_tasks(user_id, limit=batch_size, cursor=cursor, **filters)
+        for task in page["tasks"]:
+            yield task
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
+
+
+async def create_tasks(tasks, user_id=LEGACY_USER_ID):
+    """Insert many tasks owned by `user_id` in one executemany round-trip; returns their ids."""
+    rows = [_task_row(task, user_id) for task in tasks]
+    if not rows:
+        return []
+    async with async_session.begin() as session:
+        await session.execute(insert(Task), rows)
+    return [row["id"] for row in rows]
+
+
+async def upsert_tasks(tasks, user_id=LEGACY_USER_ID):
+    """Insert `user_id`'s tasks in one executemany statement, updating rows whose content hash exists.
+    
+    Every task needs a title. Returns the stored id for each task, in
+    order; a task seen before keeps its original id, status and creation time.
+    """
+    rows = [_task_row(task, user_id) for task in tasks]
+    if not rows:
+        return []
+    statement = sqlite_insert(Task)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Task.user_id, Task.content_hash],
+        set_={
+            "description": statement.excluded.description,
+            "due_date": statement.excluded.due_date,
+            "priority": statement.excluded.priority,
         }
-        for row in rows
+    )
+    hashes = [row["content_hash"] for row in rows]
+    async with async_session.begin() as session:
+        await session.execute(statement, rows)
+        result = await session.execute(
+            select(Task.content_hash, Task.id)
+            .where(Task.user_id == user_id, Task.content_hash.in_(set(hashes)))
+        )
+        ids_by_hash = dict(result.all())
+    return [ids_by_hash[content_hash] for content_hash in hashes]
+
+
+async def save_extracted_tasks(task_data, user_id=LEGACY_USER_ID):
+    """Persist `user_id`'s tasks from an `extract_tasks` result and tag each with its stored id.
+    
+    Placeholder tasks (from a response that couldn't be parsed) are returned
+    but never stored.
+    """
+    extracted = [
+        {"title": task} if isinstance(task, str) else task
+        for task in task_data.get("tasks", [])
     ]
-def update_task(task_id, updates):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE tasks SET title=?, description=?, due_date=?, priority=?, status=?, project_id=?
-        WHERE id=?
-    """, (
-        updates.get("title"),
-        updates.get("description"),
-        updates.get("due_date"),
-        updates.get("priority"),
-        updates.get("status"),
-        updates.get("project_id"),
-        task_id
-    ))
-    conn.commit()
-    conn.close()
+    storable = [
+        task for task in extracted
+        if isinstance(task, dict) and task.get("title") and not task.get("placeholder")
+    ]
+    ids = await upsert_tasks(storable, user_id)
+    for task, task_id in zip(storable, ids):
+        task["id"] = task_id
+    task_data["tasks"] = extracted
+    task_data["task_ids"] = ids
+    return ids
+
+
+async def update_task(task_id, updates):
+    values = {field: updates[field] for field in TASK_FIELDS if field in updates}
+    if "due_date" in values:
+        values["due_date"] = normalize_due_date(values["due_date"])
+    if values:
+        async with async_session.begin() as session:
+            await session.execute(update(Task).where(Task.id == task_id).values(**values))
     return { "id": task_id, **updates }
 
-def delete_task(task_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM tasks WHERE id=?", (task_id,))
-    conn.commit()
-    conn.close()
+
+async def update_tasks(updates):
+    """Apply many `{"id": ..., <fields>}` updates as one bulk UPDATE by primary key."""
+    rows = [
+        {"id": item["id"], **{field: item[field] for field in TASK_FIELDS if field in item}}
+        for item in updates
+    ]
+    for row in rows:
+        if "due_date" in row:
+            row["due_date"] = normalize_due_date(row["due_date"])
+    if not rows:
+        return []
+    async with async_session.begin() as session:
+        # Bulk-by-primary-key needs a uniform column set, so group rows by the fields they touch
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        for group in groups.values():
+            if len(group[0]) > 1:
+                await session.execute(update(Task), group)
+    return rows
+
+
+async def delete_task(task_id):
+    async with async_session.begin() as session:
+        await session.execute(delete(Task).where(Task.id == task_id))
     return { "status": "deleted", "id": task_id }
+
+
+async def delete_tasks(task_ids):
+    task_ids = list(task_ids)
+    if task_ids:
+        async with async_session.begin() as session:
+            await session.execute(delete(Task).where(Task.id.in_(task_ids)))
+    return { "status": "deleted", "ids": task_ids }
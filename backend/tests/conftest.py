@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+# The API imports modules as `agents.*`/`storage.*`, the agents as `backend.*`
+for path in (ROOT_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# Keep every database the app opens inside a throwaway directory
+STORAGE_DIR = tempfile.mkdtemp(prefix="paragomus-tests-")
+os.environ.setdefault("PERPLEXITY_API_KEY", "test-key-0000000000")
+os.environ["AGNO_TELEMETRY"] = "false"
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{STORAGE_DIR}/tasks.db"
+for name, filename in (
+    ("AGENT_STORAGE_PATH", "agent.db"),
+    ("PERSONALITY_STORAGE_PATH", "personality.db"),
+    ("TASK_STORAGE_PATH", "task_sessions.db"),
+    ("PROFILE_STORAGE_PATH", "profiles.db"),
+    ("TASK_CACHE_PATH", "task_cache.db"),
+):
+    os.environ[name] = os.path.join(STORAGE_DIR, filename)
+os.environ["PDF_CACHE_DIR"] = os.path.join(STORAGE_DIR, "pdf_cache")
+
+
+class FakeProvider:
+    """Local OpenAI-compatible chat completions server.
+
+    `reply` is the assistant text, `status` the HTTP status to answer with,
+    `retry_after` an optional Retry-After header for error answers and
+    `delay` seconds to wait before answering; `requests` counts calls and
+    `bodies` keeps each request's JSON body.
+    """
+
+    def __init__(self, reply="Hello from the fake provider", status=200, delay=0.0, retry_after=None):
+        self.reply = reply
+        self.status = status
+        self.delay = delay
+        self.retry_after = retry_after
+        self.requests = 0
+        self.bodies = []
+        self.lock = threading.Lock()
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with provider.lock:
+                    provider.requests += 1
+                    provider.bodies.append(body)
+                time.sleep(provider.delay)
+                if provider.status != 200:
+                    payload = json.dumps({"error": {"message": "fake failure", "type": "rate_limit"}}).encode()
+                    self.send_response(provider.status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    if provider.retry_after is not None:
+                        self.send_header("Retry-After", str(provider.retry_after))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+                if body.get("stream"):
+                    self._stream(body)
+                else:
+                    self._complete(body)
+
+            def _complete(self, body):
+                payload = json.dumps({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": provider.reply}}],
+                    "usage": {"prompt_tokens": 5, "completion_tokens": 5, "total_tokens": 10}
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for i, word in enumerate(provider.reply.split(" ")):
+                    chunk = {
+                        "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": body.get("model", "fake"),
+                        "choices": [{"index": 0, "finish_reason": None,
+                                     "delta": {"role": "assistant", "content": ("" if i == 0 else " ") + word}}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def route(self, name):
+        return {"name": name, "provider": "OpenAI", "model": "fake-model", "api_key": "test", "base_url": self.base_url}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_provider_factory():
+    providers = []
+
+    def make(**options):
+        provider = FakeProvider(**options)
+        providers.append(provider)
+        return provider
+
+    yield make
+    for provider in providers:
+        provider.close()
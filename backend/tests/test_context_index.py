@@ -0,0 +1,36 @@
+from backend.utils.context_index import BM25Index, chunk_text, tokenize
+
+
+def test_tokenize_drops_stopwords():
+    assert tokenize("What is the Refund policy?") == ["refund", "policy"]
+
+
+def test_chunks_prefer_paragraphs_and_overlap_long_ones():
+    text = "alpha beta\n\ngamma delta\n\n" + " ".join(f"w{i}" for i in range(25))
+    chunks = chunk_text(text, chunk_words=10, overlap_words=2)
+    assert chunks[0] == "alpha beta gamma delta"
+    words = [chunk.split() for chunk in chunks[1:]]
+    assert all(len(chunk) <= 10 for chunk in words)
+    # Consecutive chunks of a long paragraph share `overlap_words` words
+    assert words[0][-2:] == words[1][:2]
+    assert chunk_text("") == []
+
+
+def test_search_ranks_matching_chunks_and_keeps_document_order():
+    chunks = [
+        "Shipping takes five business days within the country.",
+        "A refund is issued within thirty days of purchase.",
+        "Our office is closed on public holidays.",
+        "Refund requests need the original receipt and refund form.",
+    ]
+    index = BM25Index(chunks)
+    hits = index.search("how do I get a refund", k=2)
+    assert [i for i, _ in hits] == [3, 1]
+    assert index.build_context("refund", k=2) == chunks[1] + "\n\n---\n\n" + chunks[3]
+
+
+def test_unmatched_query_falls_back_to_the_start_of_the_document():
+    index = BM25Index(["first part", "second part", "third part"])
+    assert index.search("quantum", k=2) == []
+    assert index.build_context("quantum", k=2) == "first part\n\n---\n\nsecond part"
+    assert BM25Index([]).search("anything") == []
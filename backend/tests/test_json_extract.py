@@ -0,0 +1,37 @@
+import pytest
+
+from backend.utils.json_extract import JSONStreamExtractor, extract_json, extract_json_from_stream, repair_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', {"a": 1}),
+    ('Sure! Here it is:\n```json\n{"tasks": [], "summary": "none"}\n```', {"tasks": [], "summary": "none"}),
+    ('{"a": True, "b": None, "c": [1, 2,],}', {"a": True, "b": None, "c": [1, 2]}),
+    ('{"a": 1 // comment\n, "b": /* x */ 2}', {"a": 1, "b": 2}),
+    ('{“a”: “b”}', {"a": "b"}),
+    ('{"text": "braces } { inside", "n": 1}', {"text": "braces } { inside", "n": 1}),
+    ('{"tasks": [{"title": "Buy milk"', {"tasks": [{"title": "Buy milk"}]}),
+    ("no json here", None),
+])
+def test_extract_json(text, expected):
+    assert extract_json(text) == expected
+
+
+def test_non_ascii_bare_word_is_skipped_not_fatal():
+    assert extract_json('{"a": ñ}') is None
+    assert extract_json('{"a": ñ} then {"b": 2}') == {"b": 2}
+    assert repair_json("{\"a\": ñandú}") == '{"a": ñandú}'
+
+
+def test_stream_stops_at_first_complete_object():
+    chunks = iter(['noise {"a": ', '{"b": 1}', '}', ' trailing {"c": 3}', "never read"])
+    value, text = extract_json_from_stream(chunks)
+    assert value == {"a": {"b": 1}}
+    assert text == 'noise {"a": {"b": 1}}'
+    assert next(chunks) == " trailing {\"c\": 3}"
+
+
+def test_extractor_keeps_result_once_found():
+    extractor = JSONStreamExtractor()
+    assert extractor.feed('{"a": 1}') == {"a": 1}
+    assert extractor.feed('{"b": 2}') == {"a": 1}
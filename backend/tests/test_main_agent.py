@@ -0,0 +1,39 @@
+from backend.agents import model_registry
+from backend.agents.main_agent import AdaptiveChatAgent
+
+
+def chat_agent(provider, **options):
+    model = model_registry.create_model_instance("OpenAI", "fake-model", "test", base_url=provider.base_url)
+    return AdaptiveChatAgent("OpenAI", "fake-model", "test", model=model, **options)
+
+
+def test_plain_reply_after_a_streamed_one_is_text(fake_provider_factory):
+    provider = fake_provider_factory(reply="plain answer")
+    agent = chat_agent(provider, user_id="stream-then-plain")
+
+    assert agent.generate_response("First question") == "plain answer"
+    assert "".join(agent.stream_response("Second question")) == "plain answer"
+    assert agent.generate_response("Third question") == "plain answer"
+    assert [reply for _, reply in agent.history.turns] == ["plain answer"] * 3
+
+
+def test_replayed_history_stays_within_the_prompt_budget(fake_provider_factory):
+    from backend.utils.token_budget import estimate_tokens
+
+    provider = fake_provider_factory(reply="short reply")
+    agent = chat_agent(provider, user_id="budget-user", history_turns=6, max_prompt_tokens=2000)
+    document = "lorem ipsum dolor sit amet " * 4000
+
+    for turn in range(8):
+        agent.generate_response(f"Question {turn} about the document?", document)
+        "".join(agent.stream_response(f"Follow-up {turn}?", document))
+
+    # Estimates aren't additive across pieces, so allow a little slack; without
+    # the fix the replayed prompts pushed each request to several times the budget
+    for body in provider.bodies:
+        sent = [message for message in body["messages"] if message["role"] != "system"]
+        assert sum(estimate_tokens(message["content"]) for message in sent) <= 2000 * 1.05
+    # Earlier turns are replayed as the short user input, not the context-laden prompt
+    last = provider.bodies[-1]["messages"]
+    assert {"role": "user", "content": "Follow-up 6?"} in last
+    assert sum("lorem ipsum" in message["content"] for message in last) == 1
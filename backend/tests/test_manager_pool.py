@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import core.manager_pool
+from core.executor import AgentExecutor
+from core.manager_pool import AgentManagerPool
+
+
+class SlowManager:
+    """Stand-in AgentManager whose construction takes a while."""
+
+    built = []
+    release = threading.Event()
+
+    def __init__(self, provider, model, api_key, user_id=None, **options):
+        self.user_id = user_id
+        SlowManager.built.append(user_id)
+        if user_id == "slow-user":
+            SlowManager.release.wait(5)
+
+    def close(self):
+        pass
+
+
+def make_pool(monkeypatch, executor=None):
+    SlowManager.built = []
+    SlowManager.release = threading.Event()
+    monkeypatch.setattr(core.manager_pool, "AgentManager", SlowManager)
+    return AgentManagerPool("OpenAI", "fake-model", "test", executor=executor, max_size=4)
+
+
+def test_a_slow_build_does_not_block_other_users(monkeypatch):
+    pool = make_pool(monkeypatch)
+    ready = pool.get("ready-user")
+    with ThreadPoolExecutor(4) as threads:
+        slow = [threads.submit(pool.get, "slow-user") for _ in range(3)]
+        while not pool.building:
+            time.sleep(0.001)
+        start = time.perf_counter()
+        assert pool.get("ready-user") is ready
+        assert pool.get("other-user").user_id == "other-user"
+        assert time.perf_counter() - start < 1
+        SlowManager.release.set()
+        managers = [future.result(5) for future in slow]
+    # Concurrent requests for the same new user share one build
+    assert SlowManager.built.count("slow-user") == 1
+    assert all(manager is managers[0] for manager in managers)
+    assert pool.stats()["building"] == 0
+    pool.close_all()
+
+
+def test_aget_builds_on_the_executor(monkeypatch):
+    executor = AgentExecutor(2)
+    pool = make_pool(monkeypatch, executor)
+
+    async def main():
+        slow = asyncio.ensure_future(pool.aget("slow-user"))
+        while not pool.building:
+            await asyncio.sleep(0.001)
+        # The event loop stays free while the build runs
+        other = await asyncio.wait_for(pool.aget("other-user"), 1)
+        follower = asyncio.ensure_future(pool.aget("slow-user"))
+        SlowManager.release.set()
+        return other, await slow, await follower
+
+    try:
+        other, slow, follower = asyncio.run(main())
+    finally:
+        pool.close_all()
+        executor.shutdown(wait=True)
+    assert other.user_id == "other-user"
+    assert slow is follower
+    assert SlowManager.built.count("slow-user") == 1
@@ -0,0 +1,32 @@
+import numpy as np
+
+from backend.agents.personality_agent import MAX_TRAIT_WEIGHT, TRAIT_HALF_LIFE_SECONDS, blend_traits
+
+
+def test_confident_evidence_moves_traits_and_silence_leaves_them():
+    values, weights = np.array([0.5, 0.5]), np.array([1.0, 1.0])
+    observed, confidence = np.array([1.0, 0.0]), np.array([1.0, 0.0])
+    new_values, new_weights = blend_traits(values, weights, observed, confidence, 0)
+    assert np.allclose(new_values, [0.75, 0.5])
+    assert np.allclose(new_weights, [2.0, 1.0])
+
+
+def test_old_evidence_decays_by_half_life():
+    values, weights = np.array([0.0]), np.array([1.0])
+    new_values, new_weights = blend_traits(values, weights, np.array([1.0]), np.array([1.0]), TRAIT_HALF_LIFE_SECONDS)
+    # Prior weight halves to 0.5, so fresh evidence gets 2/3 of the blend
+    assert np.allclose(new_values, [2 / 3])
+    assert np.allclose(new_weights, [1.5])
+
+
+def test_weight_is_capped_and_values_stay_in_range():
+    values, weights = np.array([0.9]), np.array([MAX_TRAIT_WEIGHT])
+    new_values, new_weights = blend_traits(values, weights, np.array([3.0]), np.array([1.0]), 0)
+    assert new_weights[0] == MAX_TRAIT_WEIGHT
+    assert 0.0 <= new_values[0] <= 1.0
+
+
+def test_no_evidence_and_no_prior_keeps_values():
+    values = np.array([0.3])
+    new_values, new_weights = blend_traits(values, np.array([0.0]), np.array([1.0]), np.array([0.0]), 0)
+    assert np.allclose(new_values, [0.3]) and new_weights[0] == 0.0
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+from agno.agent import Agent
+
+import backend.agents.base  # noqa: F401 (registers the providers)
+from backend.agents import model_registry
+from backend.agents.rate_limit import ProviderLimiter, RateLimitTimeout, RateLimitedModel, TokenBucket
+from backend.agents.router import create_routed_model
+
+
+@pytest.fixture
+def limited_openai(monkeypatch):
+    """Give the OpenAI provider a budget and fast retries for the test."""
+    monkeypatch.setattr(model_registry, "MODEL_RATE_LIMITS", {"openai": {"rpm": 6000}})
+    monkeypatch.setattr(model_registry, "MODEL_RETRY_ATTEMPTS", 2)
+    monkeypatch.setattr(model_registry, "MODEL_RETRY_BASE_DELAY", 0.01)
+    monkeypatch.setattr(model_registry, "limiters", {})
+
+
+def limited_model(provider, api_key):
+    return model_registry.create_model_instance("OpenAI", "fake-model", api_key, base_url=provider.base_url)
+
+
+def test_token_bucket_reserves_then_makes_callers_wait():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    bucket.refund(1)
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_limiter_rejects_waits_beyond_max_wait_and_refunds():
+    limiter = ProviderLimiter(rpm=60, max_wait=0.5)
+    for _ in range(60):
+        limiter.acquire(0)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire(0)
+    # The rejected call gave its reservation back
+    assert limiter.requests.reserve(0) < 0.1
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_limited_model_retries_without_sdk_retries(fake_provider_factory, limited_openai):
+    throttled = fake_provider_factory(status=429)
+    model = limited_model(throttled, "throttled-key")
+    assert isinstance(model, RateLimitedModel) and model.model.max_retries == 0
+
+    with pytest.raises(Exception):
+        Agent(model=model, telemetry=False).run("Hello")
+    # One call plus MODEL_RETRY_ATTEMPTS retries, each a single HTTP request
+    assert throttled.requests == 3
+    assert model.limiter.stats()["calls"] == 3 and model.limiter.stats()["retries"] == 2
+
+
+def test_limited_model_answers_through_agent_run(fake_provider_factory, limited_openai):
+    provider = fake_provider_factory(reply="within budget")
+    model = limited_model(provider, "ok-key")
+    assert Agent(model=model, telemetry=False).run("Hello").content == "within budget"
+
+
+def test_long_retry_after_fails_fast(fake_provider_factory, limited_openai):
+    throttled = fake_provider_factory(status=429, retry_after=120)
+    model = limited_model(throttled, "retry-after-key")
+    start = time.perf_counter()
+    with pytest.raises(Exception):
+        Agent(model=model, telemetry=False).run("Hello")
+    assert throttled.requests == 1
+    assert time.perf_counter() - start < 2
+
+
+def test_limited_routes_fail_over_without_retrying(fake_provider_factory, limited_openai):
+    throttled = fake_provider_factory(status=429)
+    backup = fake_provider_factory(reply="from the backup")
+    routes = [
+        {**throttled.route("throttled"), "api_key": "route-throttled"},
+        {**backup.route("backup"), "api_key": "route-backup"},
+    ]
+    model = create_routed_model(routes)
+    assert Agent(model=model, telemetry=False).run("Hello").content == "from the backup"
+    assert throttled.requests == 1
@@ -0,0 +1,93 @@
+import time
+
+from agno.agent import Agent
+
+import backend.agents.base  # noqa: F401 (registers the providers)
+from backend.agents.router import ProviderHealth, RouteHealth, create_routed_model
+
+
+def run_agent(model, prompt="Hello", **options):
+    return Agent(model=model, telemetry=False, **options).run(prompt)
+
+
+def test_routed_model_fails_over_inside_agent_run(fake_provider_factory):
+    broken = fake_provider_factory(status=400)
+    working = fake_provider_factory(reply="from the backup")
+    model = create_routed_model([broken.route("broken"), working.route("working")])
+
+    assert run_agent(model).content == "from the backup"
+    assert broken.requests == 1 and working.requests == 1
+    stats = model.health.stats()
+    assert stats["failovers"] == 1
+    assert stats["providers"]["broken"]["error_rate"] == 1.0
+
+
+def test_routed_model_streams_inside_agent_run(fake_provider_factory):
+    broken = fake_provider_factory(status=400)
+    working = fake_provider_factory(reply="streamed from the backup")
+    model = create_routed_model([broken.route("broken"), working.route("working")])
+
+    chunks = Agent(model=model, telemetry=False).run("Hello", stream=True)
+    assert "".join(chunk.content or "" for chunk in chunks) == "streamed from the backup"
+
+
+def test_slow_route_is_hedged(fake_provider_factory):
+    slow = fake_provider_factory(reply="slow", delay=2.0)
+    fast = fake_provider_factory(reply="fast")
+    health = RouteHealth()
+    # History says "slow" usually answers in 10ms, so it is tried first
+    for _ in range(5):
+        health.get("slow").record(0.01, True)
+        health.get("fast").record(0.5, True)
+    model = create_routed_model([slow.route("slow"), fast.route("fast")], health=health, hedge=True)
+
+    start = time.perf_counter()
+    assert run_agent(model).content == "fast"
+    assert time.perf_counter() - start < 1.5
+    assert health.stats()["hedges"] == 1
+
+
+def test_unhealthy_route_is_ranked_last_until_it_recovers():
+    health = RouteHealth()
+    model = create_routed_model(
+        [{"name": name, "provider": "OpenAI", "model": "m", "api_key": "k", "base_url": "http://127.0.0.1:9/v1"}
+         for name in ("flaky", "steady")],
+        health=health, min_samples=2, recovery_seconds=60
+    )
+    for _ in range(3):
+        health.get("flaky").record(0.01, False)
+        health.get("steady").record(0.2, True)
+    assert [name for name, _ in model.ranked_routes()] == ["steady", "flaky"]
+
+    health.get("flaky").last_error_at -= 61
+    assert [name for name, _ in model.ranked_routes()] == ["flaky", "steady"]
+
+
+def test_provider_health_window():
+    health = ProviderHealth(window=4)
+    for latency, ok in ((0.1, True), (0.3, True), (9.0, False), (0.2, True), (0.4, True)):
+        health.record(latency, ok)
+    assert health.samples == 4
+    assert health.error_rate() == 0.25
+    # Latency is averaged over successful calls only
+    assert health.mean_latency() == 0.25
+    assert health.stats()["p95_latency"] is not None
+
+
+def test_agent_models_list_config_routes_a_pooled_agent(fake_provider_factory):
+    from core.manager_pool import AgentManagerPool
+
+    down = fake_provider_factory(status=400)
+    up = fake_provider_factory(reply="answered by the chat tier")
+    pool = AgentManagerPool(
+        "OpenAI", "fake-model", "test", max_size=2,
+        agent_models={"chat": [down.route("chat-primary"), up.route("chat-backup")]}
+    )
+    try:
+        manager = pool.get("tier-user")
+        assert manager.main_agent.generate_response("Hi") == "answered by the chat tier"
+        assert pool.stats()["routes"]["failovers"] == 1
+    finally:
+        executor = manager.executor
+        pool.close_all()
+        executor.shutdown(wait=True)
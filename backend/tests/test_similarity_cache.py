@@ -0,0 +1,97 @@
+import pytest
+
+from backend.utils.similarity_cache import SemanticCache, canonical_text, same_terms, terms
+
+
+def test_exact_and_near_duplicate_lookups():
+    cache = SemanticCache(maxsize=8, threshold=0.6)
+    cache.set("bucket", "How do I reset my password?", "Use the settings page")
+    assert cache.get("bucket", "how do i reset my password") == "Use the settings page"
+    assert cache.get("bucket", "How do I reset my pasword?") == "Use the settings page"
+    assert cache.get("bucket", "What is the best pizza in Naples?") is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["near_hits"], stats["misses"]) == (1, 1, 1)
+
+
+# 0.8 is the CHAT_CACHE_SIMILARITY default; at 0.5 only the term check keeps these apart
+@pytest.mark.parametrize("threshold", [0.8, 0.5])
+@pytest.mark.parametrize("section", [4, 5, 7, 8, 9, 12, 31])
+def test_questions_about_other_numbers_miss(section, threshold):
+    cache = SemanticCache(threshold=threshold)
+    cache.set("b", "Could you summarize section 3 of the installation manual for me?", "Section 3 says...")
+    assert cache.get("b", f"Could you summarize section {section} of the installation manual for me?") is None
+
+
+@pytest.mark.parametrize("threshold", [0.8, 0.5])
+def test_one_changed_key_word_misses(threshold):
+    cache = SemanticCache(threshold=threshold)
+    cache.set("b", "How do I enable two factor authentication on my account?", "Enable it in settings")
+    assert cache.get("b", "How do I disable two factor authentication on my account?") is None
+    assert cache.get("b", "How do I enable two factor authentication on my acount?") == "Enable it in settings"
+    assert cache.get("b", "how do I enable two-factor authentication on my account") == "Enable it in settings"
+
+
+def test_terms_keep_decimal_points_apart():
+    assert canonical_text("Version 3.5") != canonical_text("Version 35")
+    assert not same_terms(terms("What changed in version 3.5?"), terms("What changed in version 35?"))
+    assert same_terms(terms("Please tell me the refund policy"), terms("the refund policy?"))
+
+
+def test_buckets_do_not_share_entries():
+    cache = SemanticCache()
+    cache.set("formal", "Explain the quarterly report please", "Certainly.")
+    assert cache.get("casual", "Explain the quarterly report please") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(maxsize=2)
+    cache.set("b", "first question about taxes", 1)
+    cache.set("b", "second question about gardens", 2)
+    cache.get("b", "first question about taxes")
+    cache.set("b", "third question about rockets", 3)
+    assert cache.get("b", "second question about gardens") is None
+    assert cache.get("b", "first question about taxes") == 1
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1
+    # Evicted entries leave no band-table residue
+    assert all(key[1] != canonical_text("second question about gardens")
+               for keys in cache.band_tables.values() for key in keys)
+
+
+def test_bands_must_divide_permutations():
+    with pytest.raises(ValueError):
+        SemanticCache(num_perm=64, bands=10)
+
+
+def test_pooled_managers_share_one_response_cache(monkeypatch):
+    from api.config import settings
+    from core.manager_pool import AgentManagerPool
+
+    monkeypatch.setattr(settings, "CHAT_CACHE_ENABLED", True)
+    pool = AgentManagerPool("OpenAI", "fake-model", "test", max_size=4)
+    try:
+        first, second = pool.get("cache-alice"), pool.get("cache-bob")
+        assert pool.response_cache is not None
+        assert first.main_agent.response_cache is second.main_agent.response_cache is pool.response_cache
+    finally:
+        executors = [manager.executor for manager in pool.managers.values()]
+        pool.close_all()
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+
+def test_users_sharing_a_cache_do_not_see_each_others_replies(fake_provider_factory):
+    from backend.agents import model_registry
+    from backend.agents.main_agent import AdaptiveChatAgent
+
+    provider = fake_provider_factory(reply="a reply")
+    model = model_registry.create_model_instance("OpenAI", "fake-model", "test", base_url=provider.base_url)
+    cache = SemanticCache()
+    alice = AdaptiveChatAgent("OpenAI", "fake-model", "test", model=model, user_id="cache-a", response_cache=cache)
+    bob = AdaptiveChatAgent("OpenAI", "fake-model", "test", model=model, user_id="cache-b", response_cache=cache)
+
+    question = "What did we decide about the launch plan?"
+    alice.generate_response(question)
+    alice.generate_response(question)
+    assert provider.requests == 1
+    bob.generate_response(question)
+    assert provider.requests == 2
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call_and_get_independent_results():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def extract(text):
+        calls.append(text)
+        started.set()
+        release.wait(5)
+        return {"tasks": [{"title": text}]}
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, "key", extract, "Buy milk")
+        started.wait(5)
+        followers = [pool.submit(flight.do, "key", extract, "Buy milk") for _ in range(3)]
+        while flight.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        leader_result = leader.result()
+        # The leader's caller mutates its result while followers still read theirs
+        leader_result["tasks"][0]["id"] = "stored-1"
+        results = [follower.result() for follower in followers]
+
+    assert calls == ["Buy milk"]
+    assert results == [{"tasks": [{"title": "Buy milk"}]}] * 3
+    assert len({id(result) for result in results + [leader_result]}) == 4
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 3, "coalesced_ratio": 0.75}
+
+
+def test_errors_reach_every_waiter_and_nothing_is_cached():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("provider down")
+
+    with pytest.raises(RuntimeError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "recovered") == "recovered"
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_async_followers_await_the_leader():
+    flight = SingleFlight()
+    calls = []
+
+    async def run(fn, *args):
+        return await asyncio.to_thread(fn, *args)
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return ["result"]
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", run, slow) for _ in range(3)))
+
+    results = asyncio.run(main())
+    assert calls == [1]
+    assert results == [["result"]] * 3
+    assert results[0] is not results[1]
+
+
+def test_submit_followers_never_hold_a_pool_thread():
+    flight = SingleFlight()
+    calls = []
+    with ThreadPoolExecutor(1) as pool:
+        release = threading.Event()
+        pool.submit(release.wait, 5)
+        leader = flight.submit("key", pool.submit, lambda: calls.append(1) or {"tasks": []})
+        follower = flight.submit("key", pool.submit, lambda: calls.append(2) or {"tasks": []})
+        release.set()
+        assert leader.result(5) == follower.result(5) == {"tasks": []}
+    assert calls == [1]
+    assert leader.result() is not follower.result()
+
+
+def test_chat_task_extraction_shares_a_saturated_pool_without_deadlock(monkeypatch):
+    from core.agent_manager import AgentManager
+    from core.executor import AgentExecutor
+
+    executor = AgentExecutor(1)
+    manager = AgentManager("OpenAI", "fake-model", "test", executor=executor, user_id="flight-test")
+    calls = []
+    monkeypatch.setattr(manager.task_agent, "extract_tasks",
+                        lambda prompt, adaptations: calls.append(prompt) or {"tasks": [{"title": prompt}]})
+    prompt = "Call the plumber tomorrow"
+
+    async def main():
+        release = threading.Event()
+        executor.submit(release.wait, 5)
+        # A chat pipeline's extraction and an /extract-tasks call for the same text
+        chat = asyncio.ensure_future(manager.aextract_chat_tasks(prompt))
+        await asyncio.sleep(0)
+        direct = asyncio.ensure_future(manager.aextract_tasks(prompt))
+        sync_chat = manager.submit_chat_tasks(prompt)
+        # Let every caller join while the only worker is still busy
+        await asyncio.sleep(0)
+        release.set()
+        return await asyncio.wait_for(asyncio.gather(chat, direct, asyncio.wrap_future(sync_chat)), 5)
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        manager.close()
+        executor.shutdown(wait=True)
+    assert calls == [prompt]
+    assert all(result == {"tasks": [{"title": prompt}]} for result in results)
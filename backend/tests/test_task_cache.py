@@ -0,0 +1,23 @@
+from core.agent_manager import AgentManager
+from storage.loader import load_task_cache
+
+
+def test_one_users_adaptation_change_keeps_the_shared_cache(monkeypatch):
+    cache = load_task_cache()
+    manager = AgentManager("OpenAI", "fake-model", "test", user_id="cache-flipper", task_cache=cache)
+    concise = {"task_agent_adaptations": {"detail_level": "concise"}}
+    detailed = {"task_agent_adaptations": {"detail_level": "detailed"}}
+    namespace = manager.task_agent.cache_namespace(concise["task_agent_adaptations"])
+    cache.set(namespace, "shared-key", {"tasks": [{"title": "Cached for everyone"}]})
+
+    suggestions = iter([concise, detailed])
+    monkeypatch.setattr(manager.personality_agent, "get_adaptation_suggestions", lambda: next(suggestions))
+    try:
+        manager._apply_personality({})
+        manager._apply_personality({})
+        # Other users on the concise adaptations still hit the entry
+        assert cache.get(namespace, "shared-key") == {"tasks": [{"title": "Cached for everyone"}]}
+    finally:
+        manager.close()
+        manager.executor.shutdown(wait=True)
+        cache.close()
@@ -0,0 +1,120 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from backend.tests.conftest import STORAGE_DIR
+from storage.loader import init_db
+from storage import task_db
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def setup_module():
+    run(init_db())
+
+
+def stored(user_id):
+    return [task for task in run(task_db.get_all_tasks()) if task["user_id"] == user_id]
+
+
+def test_same_task_is_deduplicated_per_user_only():
+    first = {"tasks": [{"title": "Buy milk", "priority": "low"}]}
+    second = {"tasks": [{"title": "buy milk!", "priority": "high"}]}
+    other = {"tasks": [{"title": "Buy milk", "priority": "medium"}]}
+
+    [alice_id] = run(task_db.save_extracted_tasks(first, "dedup-alice"))
+    assert run(task_db.save_extracted_tasks(second, "dedup-alice")) == [alice_id]
+    [bob_id] = run(task_db.save_extracted_tasks(other, "dedup-bob"))
+    assert bob_id != alice_id
+
+    alice = stored("dedup-alice")
+    bob = stored("dedup-bob")
+    assert [(task["id"], task["priority"]) for task in alice] == [(alice_id, "high")]
+    assert [(task["id"], task["priority"]) for task in bob] == [(bob_id, "medium")]
+
+
+def test_placeholder_tasks_are_not_stored():
+    fallback = {"tasks": [
+        {"title": "Process user request", "description": "raw text", "placeholder": True},
+        {"title": "Call the plumber"},
+    ]}
+    ids = run(task_db.save_extracted_tasks(fallback, "placeholder-user"))
+    assert len(ids) == 1
+    assert [task["title"] for task in stored("placeholder-user")] == ["Call the plumber"]
+    assert "id" not in fallback["tasks"][0]
+
+
+def test_legacy_table_is_migrated_to_per_user_rows():
+    engine = create_engine(f"sqlite:///{os.path.join(STORAGE_DIR, 'legacy.db')}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE tasks (id VARCHAR PRIMARY KEY, title VARCHAR NOT NULL, description TEXT, "
+            "due_date VARCHAR, priority VARCHAR, status VARCHAR, project_id VARCHAR, "
+            "created_at FLOAT NOT NULL, content_hash VARCHAR UNIQUE)"
+        ))
+        connection.execute(text("INSERT INTO tasks (id, title, created_at, content_hash) VALUES ('t1', 'Buy milk', 1, 'old')"))
+        task_db.migrate_tasks_table(connection)
+        row = connection.execute(text("SELECT user_id, content_hash FROM tasks")).one()
+    assert row == (task_db.LEGACY_USER_ID, task_db.task_content_hash(task_db.LEGACY_USER_ID, "Buy milk"))
+
+
+def test_due_dates_are_stored_as_iso_or_null():
+    assert task_db.normalize_due_date("2026-03-03") == "2026-03-03"
+    assert task_db.normalize_due_date(" 2026-03-03T15:00 ") == "2026-03-03T15:00:00"
+    assert task_db.normalize_due_date("tomorrow") is None
+    assert task_db.normalize_due_date("") is None
+
+    run(task_db.save_extracted_tasks({"tasks": [
+        {"title": "Free text due", "due_date": "next Friday"},
+        {"title": "Iso due", "due_date": "2026-03-03T09:30"},
+    ]}, "due-user"))
+    assert {task["title"]: task["due_date"] for task in stored("due-user")} == {
+        "Free text due": None, "Iso due": "2026-03-03T09:30:00"
+    }
+
+
+def test_pages_are_scoped_to_the_user_and_cover_every_task_once():
+    titles = [f"Task {i}" for i in range(7)]
+    run(task_db.create_tasks([{"title": title} for title in titles], "pager"))
+    run(task_db.create_tasks([{"title": "Someone else's"}], "other-pager"))
+
+    seen, cursor = [], None
+    while True:
+        page = run(task_db.list_tasks("pager", limit=3, cursor=cursor))
+        seen += [task["title"] for task in page["tasks"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    # Rows created in one batch can share a timestamp, so only the id tiebreak orders them
+    assert sorted(seen) == titles
+
+    async def export():
+        return [task["title"] async for task in task_db.iter_tasks("pager", batch_size=2)]
+    assert run(export()) == seen
+
+
+def test_due_range_pages_in_due_date_order():
+    run(task_db.create_tasks([
+        {"title": "Late", "due_date": "2026-05-01"},
+        {"title": "Early", "due_date": "2026-03-01"},
+        {"title": "Same day", "due_date": "2026-04-30T18:00"},
+        {"title": "Undated"},
+        {"title": "Out of range", "due_date": "2026-06-01"},
+    ], "due-pager"))
+
+    seen, cursor = [], None
+    while True:
+        page = run(task_db.list_tasks("due-pager", limit=1, cursor=cursor,
+                                      due_after="2026-03-01", due_before="2026-05-01"))
+        seen += [task["title"] for task in page["tasks"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["Early", "Same day", "Late"]
+
+    with pytest.raises(ValueError):
+        run(task_db.list_tasks("due-pager", due_after="tomorrow"))
@@ -0,0 +1,39 @@
+import pytest
+
+from backend.services.task_extraction import ActionabilityGate, actionability_score
+
+# (message, contains a task)
+LABELLED = [
+    ("Meeting with John tomorrow at 3pm", True),
+    ("Dentist appointment March 3", True),
+    ("Call the bank about the card", True),
+    ("I need to renew my passport", True),
+    ("Please send the slides to Ana by Friday", True),
+    ("Could you book a table for two?", True),
+    ("Groceries:\n- milk\n- eggs\n- bread", True),
+    ("Remind me to water the plants", True),
+    ("Thanks, that was really helpful!", False),
+    ("What is the capital of Portugal?", False),
+    ("What's the weather like tomorrow?", False),
+    ("I love how this app looks", False),
+    ("Tell me a joke", False),
+    ("", False),
+]
+
+
+@pytest.mark.parametrize("message, actionable", LABELLED)
+def test_default_gate_matches_labelled_examples(message, actionable):
+    assert ActionabilityGate().allows(message) is actionable
+
+
+def test_scores_stay_in_unit_range():
+    assert actionability_score("Call mom tomorrow, I need to pay rent!\n- a\n- b") == 1.0
+    assert actionability_score("Why?") == 0.0
+
+
+def test_gate_counts_skips():
+    gate = ActionabilityGate(threshold=0.4)
+    gate.allows("Call the plumber")
+    gate.allows("Nice weather")
+    stats = gate.stats()
+    assert (stats["checked"], stats["skipped"], stats["skip_rate"]) == (2, 1, 0.5)
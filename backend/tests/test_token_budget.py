@@ -0,0 +1,29 @@
+from backend.utils.token_budget import TRUNCATION_MARKER, RollingHistory, estimate_tokens, truncate_to_tokens
+
+
+def test_estimate_uses_the_larger_of_chars_and_words():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("a b c d e f g h i j") == int(10 * 1.3) + 1
+    assert estimate_tokens("x" * 400) == 101
+
+
+def test_truncation_fits_the_budget_and_marks_the_cut():
+    text = "word " * 1000
+    cut = truncate_to_tokens(text, 100)
+    assert cut.endswith(TRUNCATION_MARKER)
+    assert estimate_tokens(cut) <= 100
+    assert truncate_to_tokens("short text", 100) == "short text"
+    assert truncate_to_tokens(text, 0) == ""
+
+
+def test_rolling_history_folds_old_turns_into_a_bounded_digest():
+    history = RollingHistory(max_turns=2, digest_tokens=60)
+    for i in range(10):
+        history.add(f"question {i} " + "detail " * 30, f"answer {i}")
+    assert [user.split()[1] for user, _ in history.turns] == ["8", "9"]
+    assert history.digest_lines and estimate_tokens(history.digest) <= 60
+    # Oldest gists are dropped first, and gists are cut to 20 words
+    assert "question 7" in history.digest_lines[-1]
+    assert "question 0" not in history.digest
+    assert "…" in history.digest_lines[-1]
+    assert history.recent_tokens() > 0
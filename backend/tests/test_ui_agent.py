@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from backend.agents.ui_agent import GenerativeUIAgent
+
+
+@pytest.fixture
+def ui_agent():
+    return GenerativeUIAgent("OpenAI", "fake-model", "test")
+
+
+def test_auto_mode_asks_llm_only_for_layout_requests(ui_agent):
+    assert ui_agent.should_use_llm("Please redesign the dashboard with a dark palette")
+    assert not ui_agent.should_use_llm("")
+    assert not GenerativeUIAgent("OpenAI", "fake-model", "test", llm_mode="never").should_use_llm("custom theme")
+
+
+def test_rule_engine_config_is_cached_by_hashed_context(ui_agent):
+    adaptations = {"color_scheme": "dark", "layout": "minimal"}
+    first = ui_agent.generate_ui_config("", adaptations)
+    assert first["theme"]["colorScheme"] == "dark"
+    assert ui_agent.generate_ui_config("", adaptations) is first
+    # Keys hold hashes, never the (possibly document-sized) context text
+    assert all(len(part) == 40 for key in ui_agent.config_cache.entries for part in key[1:3])
+
+
+def test_chat_pipeline_builds_ui_config_without_chat_context(monkeypatch):
+    from core.agent_manager import AgentManager
+
+    manager = AgentManager("OpenAI", "fake-model", "test", user_id="ui-test")
+    contexts = []
+    monkeypatch.setattr(manager.personality_agent, "analyze_and_update", lambda *args, **kwargs: {})
+    monkeypatch.setattr(manager.main_agent, "generate_response", lambda *args, **kwargs: "reply")
+    monkeypatch.setattr(manager.task_agent, "extract_tasks", lambda *args, **kwargs: {"tasks": []})
+    monkeypatch.setattr(
+        manager.ui_agent, "generate_ui_config",
+        lambda context="", ui_adaptations=None: contexts.append(context) or {}
+    )
+    try:
+        asyncio.run(manager.achat_pipeline("What theme does the novel explore?", "Our product colors are blue"))
+        manager.chat_pipeline("What theme does the novel explore?", "Our product colors are blue")
+    finally:
+        manager.close()
+        manager.executor.shutdown(wait=True)
+    assert contexts == ["", ""]
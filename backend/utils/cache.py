@@ -0,0 +1,146 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def stable_hash(value):
+    """Hash a JSON-serializable value independently of dict key order."""
+    payload = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace so trivially different inputs share a key."""
+    return " ".join((text or "").lower().split())
+
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with an optional per-entry TTL.
+
+    Hit, miss and eviction counters are kept so the cache can be sized
+    from real traffic via `stats()`.
+    """
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose key matches `predicate`."""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+
+class TieredCache:
+    """In-memory LRU in front of a persistent cache (e.g. storage.sqlite_cache.SQLiteCache).
+
+    Values are stored as JSON, so every `get` returns a fresh copy that
+    callers may mutate. Keys are `"<namespace>:<key>"` strings, which lets a
+    whole namespace be invalidated in both tiers.
+    """
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace, key):
+        full_key = f"{namespace}:{key}"
+        payload = self.memory.get(full_key)
+        if payload is None and self.disk is not None:
+            payload = self.disk.get(full_key)
+            if payload is not None:
+                self.memory.set(full_key, payload)
+        with self.lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(payload)
+
+    def set(self, namespace, key, value):
+        full_key = f"{namespace}:{key}"
+        payload = json.dumps(value)
+        self.memory.set(full_key, payload)
+        if self.disk is not None:
+            self.disk.set(full_key, payload, namespace=namespace)
+
+    def invalidate_namespace(self, namespace):
+        prefix = f"{namespace}:"
+        self.memory.invalidate_where(lambda key: key.startswith(prefix))
+        if self.disk is not None:
+            self.disk.invalidate_namespace(namespace)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            overall = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+        return {
+            **overall,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
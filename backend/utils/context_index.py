@@ -0,0 +1,103 @@
+import re
+from collections import Counter, defaultdict
+import numpy as np
+
+TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my of on or so that the their then there these this to was we were what when where
+which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens with common stopwords removed."""
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_text(text, chunk_words=220, overlap_words=40):
+    """Split text into overlapping passages of roughly `chunk_words` words.
+
+    Paragraph boundaries are preferred; a paragraph longer than a chunk is
+    split on word boundaries with `overlap_words` of carry-over.
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text or "") if p.strip()]
+    chunks = []
+    current = []
+    for paragraph in paragraphs:
+        words = paragraph.split()
+        if current and len(current) + len(words) > chunk_words:
+            chunks.append(" ".join(current))
+            current = current[-overlap_words:] if overlap_words else []
+        current.extend(words)
+        while len(current) > chunk_words:
+            chunks.append(" ".join(current[:chunk_words]))
+            current = current[chunk_words - overlap_words:]
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over text chunks with per-term postings in NumPy arrays.
+
+    Scoring a query touches only the postings of its terms, so lookup cost
+    scales with the matching chunks rather than the whole document.
+    """
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = list(chunks)
+        self.k1 = k1
+        self.b = b
+
+        doc_ids = defaultdict(list)
+        term_freqs = defaultdict(list)
+        lengths = np.zeros(len(self.chunks), dtype=np.float32)
+        for doc_id, chunk in enumerate(self.chunks):
+            counts = Counter(tokenize(chunk))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                doc_ids[term].append(doc_id)
+                term_freqs[term].append(tf)
+
+        n_docs = max(len(self.chunks), 1)
+        self.avg_length = float(lengths.mean()) if len(self.chunks) else 0.0
+        # Length normalization term per chunk, precomputed once
+        self.norms = self.k1 * (1 - self.b + self.b * lengths / max(self.avg_length, 1e-9))
+        self.postings = {}
+        for term, ids in doc_ids.items():
+            ids = np.asarray(ids, dtype=np.int32)
+            tfs = np.asarray(term_freqs[term], dtype=np.float32)
+            idf = np.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            self.postings[term] = (ids, tfs, idf)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def scores(self, query):
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs, idf = posting
+            scores[ids] += idf * tfs * (self.k1 + 1) / (tfs + self.norms[ids])
+        return scores
+
+    def search(self, query, k=5):
+        """Return up to `k` (chunk_index, score) pairs with a positive score, best first."""
+        if not self.chunks:
+            return []
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def build_context(self, query, k=5):
+        """Top-k relevant chunks joined in document order, ready for a prompt."""
+        hits = sorted(i for i, _ in self.search(query, k))
+        if not hits:
+            # Nothing matched lexically; fall back to the start of the document
+            hits = list(range(min(k, len(self.chunks))))
+        return "\n\n---\n\n".join(self.chunks[i] for i in hits)
@@ -0,0 +1,160 @@
+import json
+import re
+
+# Typographic quotes LLMs sometimes emit in place of ASCII ones
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+BARE_WORD = re.compile(r"[^\W\d]\w*")
+
+
+def repair_json(text):
+    """Fix common LLM JSON mistakes outside of string literals.
+
+    Handles // and /* */ comments, trailing commas, Python literals
+    (True/False/None), smart quotes and a truncated tail (unclosed
+    strings, objects and arrays are closed).
+    """
+    text = text.translate(SMART_QUOTES)
+    out = []
+    closers = []
+    in_string = False
+    escape = False
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            i += 1
+            continue
+        if ch == '"':
+            in_string = True
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+        elif ch in "}]" and closers:
+            closers.pop()
+        elif ch.isalpha() and BARE_WORD.match(text, i):
+            word = BARE_WORD.match(text, i).group(0)
+            out.append(PYTHON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        out.append(ch)
+        i += 1
+
+    if in_string:
+        out.append('"')
+    repaired = "".join(out).rstrip().rstrip(",")
+    repaired += "".join(reversed(closers))
+    return TRAILING_COMMA.sub(r"\1", repaired)
+
+
+def parse_json_object(candidate):
+    """Parse a candidate object, trying a repair pass if strict parsing fails."""
+    for attempt in (candidate, repair_json(candidate)):
+        try:
+            value = json.loads(attempt)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+class JSONStreamExtractor:
+    """Balanced-brace scanner that finds the first complete JSON object in a stream.
+
+    Feed text chunks as they arrive; `feed` returns the parsed object as
+    soon as its closing brace is seen, so callers can stop reading the
+    rest of the response. Braces inside string literals are ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.start = -1
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.result = None
+
+    @property
+    def text(self):
+        return self.buffer
+
+    def feed(self, chunk):
+        """Add a chunk; return the first complete object once available."""
+        if self.result is not None:
+            return self.result
+        self.buffer += chunk
+        buffer = self.buffer
+        while self.pos < len(buffer):
+            ch = buffer[self.pos]
+            if self.start < 0:
+                if ch == "{":
+                    self.start = self.pos
+                    self.depth = 1
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    value = parse_json_object(buffer[self.start:self.pos + 1])
+                    self.pos += 1
+                    if value is not None:
+                        self.result = value
+                        return value
+                    # Not valid even after repair; look for the next object
+                    self.start = -1
+                    continue
+            self.pos += 1
+        return None
+
+    def finish(self):
+        """Call at end of stream; tries to salvage a truncated trailing object."""
+        if self.result is None and self.start >= 0:
+            self.result = parse_json_object(self.buffer[self.start:])
+        return self.result
+
+
+def extract_json(text):
+    """Return the first JSON object in `text`, or None."""
+    extractor = JSONStreamExtractor()
+    return extractor.feed(text or "") or extractor.finish()
+
+
+def extract_json_from_stream(chunks):
+    """Consume text chunks until the first JSON object closes.
+
+    Returns `(value, text)` where `value` is the parsed object (or None)
+    and `text` is everything read so far. Stops reading as soon as the
+    object is complete.
+    """
+    extractor = JSONStreamExtractor()
+    for chunk in chunks:
+        if chunk and extractor.feed(chunk) is not None:
+            break
+    return extractor.finish(), extractor.text
@@ -1,6 +1,110 @@
-from agno.document.reader.pdf_reader import PDFReader
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import mmap
+import os
+import numpy as np
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", ".pdf_cache")
+# Below this many pages a process pool costs more than it saves
+PARALLEL_MIN_PAGES = 16
+
+
+def _file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_paths(content_hash):
+    base = os.path.join(PDF_CACHE_DIR, content_hash)
+    return base + ".txt", base + ".offsets.npy"
+
+
+def _extract_page_range(file_path, start, stop):
+    """Worker: extract the text of pages [start, stop) with pypdf."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _extract_pages(file_path):
+    """Extract page texts, spreading page ranges over a process pool for large files."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        # Same single-threaded path as before, via agno's reader
+        from agno.document.reader.pdf_reader import PDFReader
+        return [doc.content or "" for doc in PDFReader().read(file_path)]
+
+    page_count = len(PdfReader(file_path).pages)
+    workers = min(os.cpu_count() or 1, max(page_count // PARALLEL_MIN_PAGES, 1))
+    if workers <= 1:
+        return _extract_page_range(file_path, 0, page_count)
+
+    step = -(-page_count // workers)
+    starts = list(range(0, page_count, step))
+    stops = [min(start + step, page_count) for start in starts]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(_extract_page_range, [file_path] * len(starts), starts, stops)
+        return [page for part in parts for page in part]
+
+
+def _page_offsets(encoded_pages, separator_length=1):
+    """Byte offset where each page starts in the joined text, plus the end offset."""
+    offsets = np.zeros(len(encoded_pages) + 1, dtype=np.int64)
+    for i, page in enumerate(encoded_pages):
+        offsets[i + 1] = offsets[i] + len(page) + (separator_length if i < len(encoded_pages) - 1 else 0)
+    return offsets
+
+
+def _write_cache(content_hash, encoded_pages, offsets):
+    text_path, offsets_path = _cache_paths(content_hash)
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+
+    tmp_text, tmp_offsets = text_path + ".tmp", offsets_path + ".tmp.npy"
+    with open(tmp_text, "wb") as f:
+        f.write(b"\n".join(encoded_pages))
+    np.save(tmp_offsets, offsets)
+    # Publish atomically so a concurrent reader never sees half a cache entry
+    os.replace(tmp_offsets, offsets_path)
+    os.replace(tmp_text, text_path)
+
+
+def _read_cache(content_hash):
+    text_path, offsets_path = _cache_paths(content_hash)
+    if not (os.path.exists(text_path) and os.path.exists(offsets_path)):
+        return None
+    offsets = np.load(offsets_path, mmap_mode="r")
+    if os.path.getsize(text_path) == 0:
+        return "", offsets
+    with open(text_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return data[:].decode("utf-8"), offsets
+
+
+def load_pdf_pages(file_path):
+    """Return `(text, page_offsets)` for a PDF, using the content-hash cache.
+
+    `page_offsets` is an int64 array (memory-mapped when read from the
+    cache) of UTF-8 byte offsets where each non-empty page starts in
+    `text`, followed by the end offset.
+    """
+    content_hash = _file_hash(file_path)
+    cached = _read_cache(content_hash)
+    if cached is not None:
+        return cached
+
+    encoded_pages = [page.encode("utf-8") for page in _extract_pages(file_path) if page]
+    offsets = _page_offsets(encoded_pages)
+    try:
+        _write_cache(content_hash, encoded_pages, offsets)
+    except OSError as e:
+        print(f"Warning: Could not cache extracted PDF text: {e}")
+    return b"\n".join(encoded_pages).decode("utf-8"), offsets
+
 
 def extract_text_from_pdf(file_path):
-    reader = PDFReader()
-    documents = reader.read(file_path)
-    return "\n".join(doc.content for doc in documents if doc.content)
+    text, _ = load_pdf_pages(file_path)
+    return text
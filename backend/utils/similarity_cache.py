@@ -0,0 +1,209 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+import numpy as np
+
+from backend.utils.cache import normalize_text
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+NUMBER = re.compile(r"\d+")
+# Words whose presence or absence doesn't change what a question asks
+FILLER_WORDS = frozenset("""
+a an the please pls kindly can could would will you me i my we our to of for about on in do does is are
+just quickly briefly tell
+""".split())
+# Mersenne prime used for the universal hash family h(x) = (a*x + b) mod p
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+
+def canonical_text(text):
+    """Lowercased, whitespace-collapsed text with punctuation turned into spaces."""
+    # A space, not nothing: "3.5" and "35" must not become the same key
+    return " ".join(PUNCTUATION.sub(" ", normalize_text(text)).split())
+
+
+def _within_one_edit(a, b):
+    """True if `a` and `b` differ by at most one insertion, deletion or substitution."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + (len(a) == len(b)):] == b[i + 1:]
+
+
+def terms(text):
+    """(numbers, content words) of a text; near-duplicates must agree on both."""
+    words = canonical_text(text).split()
+    numbers = frozenset(NUMBER.findall(" ".join(words)))
+    content = frozenset(word for word in words if word not in FILLER_WORDS and not word.isdigit())
+    return numbers, content
+
+
+def same_terms(first, second):
+    """True if two `terms` results differ only trivially.
+
+    Numbers must match exactly ("section 3" vs "section 4"). Every content
+    word must appear in the other text, or as a one-letter typo of a word
+    there when both are at least 5 letters ("pasword"), so "enable" and
+    "disable" stay different questions.
+    """
+    (numbers_a, words_a), (numbers_b, words_b) = first, second
+    if numbers_a != numbers_b:
+        return False
+
+    def covered(words, others):
+        return all(
+            word in others or (len(word) >= 5 and any(
+                len(other) >= 5 and _within_one_edit(word, other) for other in others
+            ))
+            for word in words
+        )
+    return covered(words_a, words_b) and covered(words_b, words_a)
+
+
+def shingles(text, ngram=4):
+    """Character n-grams of the canonical text, hashed to 32 bits."""
+    text = canonical_text(text)
+    if len(text) <= ngram:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + ngram].encode("utf-8")) for i in range(len(text) - ngram + 1)}
+
+
+class MinHasher:
+    """MinHash signatures over character n-gram shingles.
+
+    The fraction of equal signature slots estimates the Jaccard similarity
+    of two texts' shingle sets, so typos, casing and small rewordings of
+    the same question score high.
+    """
+
+    def __init__(self, num_perm=64, ngram=4, seed=1):
+        rng = np.random.default_rng(seed)
+        self.ngram = ngram
+        # 32-bit coefficients keep a*x + b inside uint64 for 32-bit shingles
+        self.a = rng.integers(1, MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text):
+        values = np.fromiter(shingles(text, self.ngram), dtype=np.uint64)
+        hashed = (values[:, None] * self.a + self.b) % MERSENNE_PRIME & MAX_HASH
+        return hashed.min(axis=0).astype(np.uint32)
+
+
+class SemanticCache:
+    """Size-bounded cache with exact and near-duplicate lookup of text keys.
+
+    Entries live in a `bucket` (e.g. the user, adaptation settings and
+    context hash) and only match queries in the same bucket. Exact matches
+    on the canonical text are checked first; otherwise LSH banding over
+    MinHash signatures finds candidates whose estimated similarity reaches
+    `threshold`, and a candidate is only used if its numbers and content
+    words agree with the query's (see `same_terms`). Questions that differ
+    in one key word ("enable" vs "disable", "section 3" vs "section 4")
+    share most n-grams, so similarity alone is not enough. The least
+    recently used entry is evicted beyond `maxsize`.
+    """
+
+    def __init__(self, maxsize=512, threshold=0.8, num_perm=64, bands=16, ngram=4):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, ngram)
+        # (bucket, canonical text) -> (signature, terms, value), in LRU order
+        self.entries = OrderedDict()
+        # (bucket, band index, band bytes) -> entry keys sharing that band
+        self.band_tables = defaultdict(set)
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _band_keys(self, bucket, signature):
+        return [
+            (bucket, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def get(self, bucket, text):
+        key = (bucket, canonical_text(text))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[2]
+
+        signature = self.hasher.signature(text)
+        query_terms = terms(text)
+        with self.lock:
+            candidates = set()
+            for band_key in self._band_keys(bucket, signature):
+                candidates.update(self.band_tables.get(band_key, ()))
+
+            best_key, best_similarity = None, self.threshold
+            for candidate in candidates:
+                candidate_signature, candidate_terms, _ = self.entries[candidate]
+                similarity = float(np.mean(candidate_signature == signature))
+                if similarity >= best_similarity and same_terms(query_terms, candidate_terms):
+                    best_key, best_similarity = candidate, similarity
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(best_key)
+            self.near_hits += 1
+            return self.entries[best_key][2]
+
+    def set(self, bucket, text, value):
+        key = (bucket, canonical_text(text))
+        signature = self.hasher.signature(text)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (signature, terms(text), value)
+            for band_key in self._band_keys(bucket, signature):
+                self.band_tables[band_key].add(key)
+            while len(self.entries) > self.maxsize:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        signature = self.entries.pop(key)[0]
+        for band_key in self._band_keys(key[0], signature):
+            keys = self.band_tables.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.band_tables[band_key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.band_tables.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            hits = self.exact_hits + self.near_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "threshold": self.threshold,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": hits / lookups if lookups else 0.0
+            }
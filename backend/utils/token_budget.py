@@ -0,0 +1,67 @@
+import re
+from collections import deque
+
+WORD = re.compile(r"\S+")
+TRUNCATION_MARKER = " …[truncated]"
+
+
+def estimate_tokens(text):
+    """Fast local token estimate (no tokenizer download).
+
+    Uses the larger of ~4 characters per token and ~1.3 tokens per word,
+    which tracks BPE tokenizers closely enough for budgeting prompts.
+    """
+    if not text:
+        return 0
+    words = len(WORD.findall(text))
+    return int(max(len(text) / 4, words * 1.3)) + 1
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut `text` down to roughly `max_tokens` tokens, marking the cut."""
+    if not text or estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    # Start from the character estimate, then shrink until the estimate fits
+    limit = max_tokens * 4
+    while limit > 0 and estimate_tokens(text[:limit]) + 4 > max_tokens:
+        limit = int(limit * 0.9)
+    return text[:limit].rstrip() + TRUNCATION_MARKER
+
+
+def _gist(text, max_words=20):
+    words = WORD.findall(text or "")
+    gist = " ".join(words[:max_words])
+    return gist + ("…" if len(words) > max_words else "")
+
+
+class RollingHistory:
+    """Recent conversation turns plus a compact digest of older ones.
+
+    Keeps the last `max_turns` (user, assistant) pairs verbatim. Older
+    turns are folded into one-line gists, and the digest is bounded to
+    `digest_tokens` by dropping the oldest gists first.
+    """
+
+    def __init__(self, max_turns=6, digest_tokens=300):
+        self.max_turns = max_turns
+        self.digest_tokens = digest_tokens
+        self.turns = deque()
+        self.digest_lines = deque()
+
+    def add(self, user_input, assistant_response):
+        self.turns.append((user_input, assistant_response))
+        while len(self.turns) > self.max_turns:
+            old_user, old_assistant = self.turns.popleft()
+            self.digest_lines.append(f"- User: {_gist(old_user)} | Assistant: {_gist(old_assistant)}")
+        while self.digest_lines and estimate_tokens(self.digest) > self.digest_tokens:
+            self.digest_lines.popleft()
+
+    @property
+    def digest(self):
+        return "\n".join(self.digest_lines)
+
+    def recent_tokens(self):
+        """Estimated tokens of the verbatim turns the model will see as history."""
+        return sum(estimate_tokens(user) + estimate_tokens(assistant) for user, assistant in self.turns)
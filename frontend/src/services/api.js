@@ -176,11 +176,14 @@ export class WebSocketService {
     }
   }
 
-  sendChatMessage(message, context = '') {
+  sendChatMessage(message, context = '', stream = false) {
+    // With stream=true the server answers with chat_delta frames, a chat_done
+    // frame, then tasks / ui_config / personality_profile frames
     this.send({
       type: 'chat',
       message,
-      context
+      context,
+      stream
     });
   }
 
@@ -209,12 +209,19 @@ def main():
         setup_providers()
         agent = initialize_agent()
         context_text = load_pdf_context()
+        if context_text:
+            # Build the retrieval index up front so the first question isn't slowed down
+            index = agent.index_context(context_text)
+            print(f"✅ Indexed PDF into {len(index)} passages")
         
         print("\n" + "="*60)
         
         # Start the enhanced chat loop
         chat_loop(agent, context_text)
         
+        # Flush the personality profile before exiting
+        agent.close()
+        
     except Exception as e:
         print(f"❌ Critical error: {e}")
         return 1